@@ -14,7 +14,9 @@ export default function UserList({
 }) {
   const [users, setUsers] = useState([]);
   const [search, setSearch] = useState("");
+  const [searchResults, setSearchResults] = useState(null);
   const [onlineUsers, setOnlineUsers] = useState(new Set());
+  const presenceVersionRef = useRef(0);
   const [latestMessages, setLatestMessages] = useState({});
   const [unreadCounts, setUnreadCounts] = useState({});
   const [typingUserId, setTypingUserId] = useState(null);
@@ -32,9 +34,10 @@ export default function UserList({
       setTypingUserId(String(data.sender_id));
 
       clearTimeout(typingTimeoutRef.current);
+      // Fallback only: the server sends typing_stop after inactivity
       typingTimeoutRef.current = setTimeout(() => {
         setTypingUserId(null);
-      }, 1200);
+      }, 8000);
     };
 
     const handleTypingStop = (data) => {
@@ -101,38 +104,6 @@ export default function UserList({
     }
   }, [currentUserId]);
 
-  useEffect(() => {
-    if (!currentUserId) return;
-
-    const handleUserListUpdate = (data) => {
-      if (data.type !== "new_message") return;
-
-      const msg = data.message;
-      const otherUserId =
-        String(msg.sender_id) === String(currentUserId)
-          ? String(msg.receiver_id)
-          : String(msg.sender_id);
-
-      setLatestMessages((prev) => ({
-        ...prev,
-        [otherUserId]: msg,
-      }));
-
-      if (String(msg.sender_id) !== String(currentUserId) && !msg.is_seen) {
-        setUnreadCounts((prev) => ({
-          ...prev,
-          [otherUserId]: (prev[otherUserId] || 0) + 1,
-        }));
-      }
-    };
-
-    socket.on("user_list_update", handleUserListUpdate);
-
-    return () => {
-      socket.off("user_list_update", handleUserListUpdate);
-    };
-  }, [currentUserId]);
-
   /* =========================
      SOCKET EVENTS
      ========================= */
@@ -141,6 +112,7 @@ export default function UserList({
 
     socket.emit("register", { user_id: currentUserId });
 
+    // Every socket of both users gets each new message once, chat open or not
     socket.on("new_message", (data) => {
       const senderId = String(data.sender_id);
       const receiverId = String(data.receiver_id);
@@ -167,22 +139,26 @@ export default function UserList({
       }));
     });
 
-    socket.on("user_online", ({ user_id }) => {
-      setOnlineUsers((prev) => new Set([...prev, String(user_id)]));
-    });
-
-    socket.on("online_users_list", ({ online_users }) => {
+    // Presence: a snapshot of online contacts, then versioned deltas on top of it
+    socket.on("presence_snapshot", ({ version, online_users }) => {
+      presenceVersionRef.current = version;
       setOnlineUsers(new Set(online_users.map(String)));
     });
 
-    socket.on("user_offline", ({ user_id }) => {
+    socket.on("presence_delta", ({ version, online, offline }) => {
+      if (version < presenceVersionRef.current) return;
+      presenceVersionRef.current = version;
       setOnlineUsers((prev) => {
         const s = new Set(prev);
-        s.delete(String(user_id));
+        online.forEach((id) => s.add(String(id)));
+        offline.forEach((id) => s.delete(String(id)));
         return s;
       });
     });
 
+    // The connect-time snapshot may have arrived before these listeners
+    socket.emit("presence_sync");
+
     return () => socket.removeAllListeners();
   }, [currentUserId]);
 
@@ -206,12 +182,50 @@ export default function UserList({
     });
   };
 
-  const filteredUsers = users.filter(
-    (u) =>
-      u.first_name?.toLowerCase().includes(search.toLowerCase()) ||
-      u.last_name?.toLowerCase().includes(search.toLowerCase()) ||
-      u.username?.toLowerCase().includes(search.toLowerCase())
-  );
+  /* =========================
+     SERVER-SIDE SEARCH
+     ========================= */
+  useEffect(() => {
+    const query = search.trim();
+    if (!query) {
+      setSearchResults(null);
+      return;
+    }
+
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const res = await api.get("/users/search", {
+          params: { q: query, limit: 50 },
+        });
+        if (cancelled) return;
+        setSearchResults(
+          (res.data?.users || []).filter(
+            (u) => String(u.uid) !== String(currentUserId)
+          )
+        );
+      } catch (err) {
+        console.error("❌ User search failed:", err);
+        // Fall back to filtering the list we already have
+        if (!cancelled) setSearchResults(null);
+      }
+    }, 150);
+
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [search, currentUserId]);
+
+  const filteredUsers =
+    search.trim() && searchResults
+      ? searchResults
+      : users.filter(
+          (u) =>
+            u.first_name?.toLowerCase().includes(search.toLowerCase()) ||
+            u.last_name?.toLowerCase().includes(search.toLowerCase()) ||
+            u.username?.toLowerCase().includes(search.toLowerCase())
+        );
 
   const sortedUsers = [...filteredUsers].sort((a, b) => {
     const aMsg = latestMessages[a.uid]?.date_sent;
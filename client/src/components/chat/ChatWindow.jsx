@@ -42,6 +42,9 @@ export default function ChatWindow({
   const startYRef = useRef(0);
   const [replyingTo, setReplyingTo] = useState(null);
   const [loading, setLoading] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null); // message_id to load older history from
+  const [loadingOlder, setLoadingOlder] = useState(false);
+  const skipAutoScrollRef = useRef(false);
 
   const handleReactionClick = (message) => {
     setReactionDetails(message);
@@ -120,14 +123,22 @@ export default function ChatWindow({
     if (!receiver || !messages.length) return;
     if (activeTab !== "chat") return; // only mark seen if user is in chat tab
 
-    messages.forEach((msg) => {
-      if (msg.sender_id === receiver.uid && !msg.is_seen && socket.connected) {
-        socket.emit("mark_message_seen", {
-          message_id: msg.message_id,
-          viewer_id: sender_id,
-        });
-      }
-    });
+    // Read receipts are a watermark: reporting the newest unseen message covers the older ones
+    const newestUnseen = messages.reduce(
+      (max, msg) =>
+        msg.sender_id === receiver.uid && !msg.is_seen && msg.message_id > max
+          ? msg.message_id
+          : max,
+      0
+    );
+
+    if (newestUnseen && socket.connected) {
+      socket.emit("mark_message_seen", {
+        message_id: newestUnseen,
+        viewer_id: sender_id,
+        sender_id: receiver.uid,
+      });
+    }
   }, [messages, receiver, sender_id, activeTab]);
 
   useEffect(() => {
@@ -164,22 +175,10 @@ export default function ChatWindow({
           withCredentials: true,
         });
 
-        const messagesData = res.data;
+        // Pages come newest-first; the chat renders oldest-first
+        const messagesData = [...res.data.messages].reverse();
         setMessages(messagesData);
-
-        const unreadMessages = messagesData.filter(
-          (msg) => msg.sender_id == receiver.uid && !msg.is_seen
-        );
-
-        if (unreadMessages.length > 0) {
-          socket.on("message_seen_update", ({ message_id }) => {
-            setMessages((prev) =>
-              prev.map((msg) =>
-                msg.message_id === message_id ? { ...msg, is_seen: true } : msg
-              )
-            );
-          });
-        }
+        setNextCursor(res.data.next_cursor);
       } catch (err) {
         console.error("Error in fetchAndJoin:", err);
       } finally {
@@ -235,6 +234,7 @@ export default function ChatWindow({
           socket.emit("mark_message_seen", {
             message_id: msg.message_id,
             viewer_id: sender_id,
+            sender_id: msg.sender_id,
           });
         }
       }
@@ -269,10 +269,27 @@ export default function ChatWindow({
       setTouchedMessage(null);
     };
 
-    const handleMessageSeenUpdate = ({ message_id }) => {
+    // Pipeline mode: messages arrive before they are stored, then get acked or fail
+    const handleMessageAck = ({ message_id }) => {
+      setMessages((prev) =>
+        prev.map((msg) =>
+          msg.message_id === message_id ? { ...msg, pending: false } : msg
+        )
+      );
+    };
+
+    const handleMessageFailed = ({ message_id, error }) => {
+      console.error("Message could not be saved:", message_id, error);
+      setMessages((prev) => prev.filter((msg) => msg.message_id !== message_id));
+    };
+
+    // One event per range: everything from sender_id up to seen_up_to is seen
+    const handleMessagesSeen = ({ sender_id: from, seen_up_to }) => {
       setMessages((prev) =>
         prev.map((msg) =>
-          msg.message_id === message_id ? { ...msg, is_seen: true } : msg
+          String(msg.sender_id) === String(from) && msg.message_id <= seen_up_to
+            ? { ...msg, is_seen: true }
+            : msg
         )
       );
     };
@@ -280,7 +297,9 @@ export default function ChatWindow({
     socket.on("new_message", handleNewMessage);
     socket.on("message_edited", handleMessageEdited);
     socket.on("reaction_updated", handleReactionUpdated);
-    socket.on("message_seen_update", handleMessageSeenUpdate);
+    socket.on("messages_seen", handleMessagesSeen);
+    socket.on("message_ack", handleMessageAck);
+    socket.on("message_failed", handleMessageFailed);
 
     // ----------------------------
     // Leave room on cleanup
@@ -289,7 +308,9 @@ export default function ChatWindow({
       socket.off("new_message", handleNewMessage);
       socket.off("message_edited", handleMessageEdited);
       socket.off("reaction_updated", handleReactionUpdated);
-      socket.off("message_seen_update", handleMessageSeenUpdate);
+      socket.off("messages_seen", handleMessagesSeen);
+      socket.off("message_ack", handleMessageAck);
+      socket.off("message_failed", handleMessageFailed);
 
       if (roomJoined) {
         socket.emit("leave_private", { user1: sender_id, user2: receiver.uid });
@@ -305,9 +326,11 @@ export default function ChatWindow({
         if (typingTimeoutRef.current) {
           clearTimeout(typingTimeoutRef.current);
         }
+        // The server repeats typing_start only every few seconds and sends
+        // typing_stop itself; this is just a fallback if the stop is lost
         typingTimeoutRef.current = setTimeout(() => {
           setIsTyping(false);
-        }, 1000);
+        }, 8000);
       }
     };
     const handleTypingStop = (data) => {
@@ -328,9 +351,46 @@ export default function ChatWindow({
 
   // Auto scroll to bottom
   useEffect(() => {
+    if (skipAutoScrollRef.current) {
+      skipAutoScrollRef.current = false;
+      return;
+    }
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
   }, [messages, isTyping]);
 
+  // Load the next older page when scrolled to the top
+  const loadOlderMessages = async (container) => {
+    if (!nextCursor || loadingOlder || !receiver) return;
+    setLoadingOlder(true);
+    try {
+      const res = await api.get(`${API_URL}/messages/${receiver.uid}`, {
+        params: { before: nextCursor },
+        withCredentials: true,
+      });
+      const previousHeight = container.scrollHeight;
+      const older = [...res.data.messages].reverse();
+
+      skipAutoScrollRef.current = true;
+      setMessages((prev) => [...older, ...prev]);
+      setNextCursor(res.data.next_cursor);
+
+      // Keep the viewport on the message the user was looking at
+      requestAnimationFrame(() => {
+        container.scrollTop = container.scrollHeight - previousHeight;
+      });
+    } catch (err) {
+      console.error("Error loading older messages:", err);
+    } finally {
+      setLoadingOlder(false);
+    }
+  };
+
+  const handleMessagesScroll = (e) => {
+    if (e.currentTarget.scrollTop === 0) {
+      loadOlderMessages(e.currentTarget);
+    }
+  };
+
   // Auto-resize textarea
   useEffect(() => {
     const textarea = textareaRef.current;
@@ -603,7 +663,10 @@ export default function ChatWindow({
       />
 
       {/* Chat Messages - FIXED CONTAINER */}
-      <div className="flex-1 pt-15 w-full overflow-y-auto bg-[var(--black)] px-2 sm:px-4 py-4">
+      <div
+        className="flex-1 pt-15 w-full overflow-y-auto bg-[var(--black)] px-2 sm:px-4 py-4"
+        onScroll={handleMessagesScroll}
+      >
         <div className="max-w-full mx-auto w-full">
           {/* Messages */}
           {messages.length === 0 && receiver ? (
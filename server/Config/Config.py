@@ -8,6 +8,91 @@ class Config():
     DB_URL = os.getenv("DB_URL")
     MESSAGE_SECRET_KEY = os.getenv("MESSAGE_SECRET_KEY")
 
+    # Retired message keys (comma separated), still accepted for decryption.
+    # New content is always encrypted with MESSAGE_SECRET_KEY.
+    MESSAGE_OLD_SECRET_KEYS = [k.strip() for k in os.getenv("MESSAGE_OLD_SECRET_KEYS", "").split(",") if k.strip()]
+    MESSAGE_KEYS = [MESSAGE_SECRET_KEY] + MESSAGE_OLD_SECRET_KEYS
+
+    # Password hashing (services/password_pool.py). Flask-Bcrypt reads
+    # BCRYPT_LOG_ROUNDS too; after a change, old hashes are upgraded on login
+    BCRYPT_LOG_ROUNDS = int(os.getenv("BCRYPT_LOG_ROUNDS", 12))
+    BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", 2))             # hashes running at once
+    BCRYPT_MAX_QUEUE = int(os.getenv("BCRYPT_MAX_QUEUE", 32))        # waiting beyond this → 503
+    BCRYPT_QUEUE_TIMEOUT = float(os.getenv("BCRYPT_QUEUE_TIMEOUT", 5))
+
+    # Database connection pool
+    DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+    DB_POOL_MAX_AGE = int(os.getenv("DB_POOL_MAX_AGE", 1800))     # seconds before a connection is recycled
+    DB_POOL_MAX_IDLE = int(os.getenv("DB_POOL_MAX_IDLE", 30))     # idle seconds before a liveness ping
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))     # seconds to wait for a free connection
+    # "green": under eventlet, queries yield to the hub (database/green.py);
+    # "blocking": plain psycopg2, every query stalls the whole process
+    DB_WAIT_MODE = os.getenv("DB_WAIT_MODE", "green")
+
+    # Multi-worker mode: Socket.IO fan-out goes through this queue
+    # (e.g. redis://localhost:6379/0). Unset = single process.
+    SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE")
+    # Shared state (presence, counters): memory:// or redis://...
+    SHARED_BACKEND_URL = os.getenv("SHARED_BACKEND_URL", SOCKETIO_MESSAGE_QUEUE or "memory://")
+
+    # Lock shards for the in-process presence registry
+    PRESENCE_SHARDS = int(os.getenv("PRESENCE_SHARDS", 16))
+    # Presence changes are batched for this many seconds before going out to contacts
+    PRESENCE_COALESCE_WINDOW = float(os.getenv("PRESENCE_COALESCE_WINDOW", 2))
+    PRESENCE_CONTACTS_TTL = int(os.getenv("PRESENCE_CONTACTS_TTL", 300))
+
+    # Typing indicator relay: repeat starts are dropped within the window,
+    # a stop is sent after the idle timeout, and each sid gets RATE events/s
+    TYPING_DEDUPE_WINDOW = float(os.getenv("TYPING_DEDUPE_WINDOW", 3))
+    TYPING_IDLE_TIMEOUT = float(os.getenv("TYPING_IDLE_TIMEOUT", 6))
+    TYPING_RATE = float(os.getenv("TYPING_RATE", 5))
+    TYPING_BURST = int(os.getenv("TYPING_BURST", 10))
+
+    # Rate limits (services/rate_limit.py): RATE hits per second, bursts up to
+    # BURST. Login/register are per IP, socket events per user.
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")   # "memory" (per worker) or "shared"
+    RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true"   # behind a proxy
+    RATE_LIMIT_LOGIN_RATE = float(os.getenv("RATE_LIMIT_LOGIN_RATE", 0.2))
+    RATE_LIMIT_LOGIN_BURST = int(os.getenv("RATE_LIMIT_LOGIN_BURST", 10))
+    RATE_LIMIT_REGISTER_RATE = float(os.getenv("RATE_LIMIT_REGISTER_RATE", 0.05))
+    RATE_LIMIT_REGISTER_BURST = int(os.getenv("RATE_LIMIT_REGISTER_BURST", 5))
+    RATE_LIMIT_SEND_RATE = float(os.getenv("RATE_LIMIT_SEND_RATE", 5))
+    RATE_LIMIT_SEND_BURST = int(os.getenv("RATE_LIMIT_SEND_BURST", 20))
+    RATE_LIMIT_REACTION_RATE = float(os.getenv("RATE_LIMIT_REACTION_RATE", 5))
+    RATE_LIMIT_REACTION_BURST = int(os.getenv("RATE_LIMIT_REACTION_BURST", 20))
+    RATE_LIMIT_EDIT_RATE = float(os.getenv("RATE_LIMIT_EDIT_RATE", 2))
+    RATE_LIMIT_EDIT_BURST = int(os.getenv("RATE_LIMIT_EDIT_BURST", 10))
+
+    # Per-message "seen" reports are coalesced for this many seconds
+    READ_RECEIPT_WINDOW = float(os.getenv("READ_RECEIPT_WINDOW", 0.5))
+
+    # Socket token refresh: seconds between refreshes, sockets per DB lookup
+    TOKEN_REFRESH_INTERVAL = int(os.getenv("TOKEN_REFRESH_INTERVAL", 900))
+    TOKEN_REFRESH_BATCH_SIZE = int(os.getenv("TOKEN_REFRESH_BATCH_SIZE", 500))
+
+    # Write-behind send_message: emit first, batch the INSERTs (see services/message_pipeline.py)
+    MESSAGE_PIPELINE = os.getenv("MESSAGE_PIPELINE", "false").lower() == "true"
+    MESSAGE_PIPELINE_BATCH_SIZE = int(os.getenv("MESSAGE_PIPELINE_BATCH_SIZE", 500))
+    MESSAGE_PIPELINE_INTERVAL = float(os.getenv("MESSAGE_PIPELINE_INTERVAL", 0.05))   # seconds between flushes
+    MESSAGE_PIPELINE_MAX_RETRIES = int(os.getenv("MESSAGE_PIPELINE_MAX_RETRIES", 5))
+    MESSAGE_ID_BLOCK = int(os.getenv("MESSAGE_ID_BLOCK", 100))    # ids reserved per sequence round trip (1 with several workers)
+
+    # Apply pending database/migrations at startup
+    DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "false").lower() == "true"
+
+    # Logging (Utils/log.py): each event logs at most LOG_RATE_LIMIT times per window
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "text")      # "text" (key=value) or "json"
+    LOG_RATE_LIMIT = int(os.getenv("LOG_RATE_LIMIT", 20))
+    LOG_RATE_WINDOW = float(os.getenv("LOG_RATE_WINDOW", 60))
+
+    # /metrics (Prometheus text format). When set, scrapes must send
+    # "Authorization: Bearer <METRICS_TOKEN>"
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+    # Decrypted message content cache (entries)
+    MESSAGE_CACHE_SIZE = int(os.getenv("MESSAGE_CACHE_SIZE", 10000))
+
     # JWT Secret Key (STRONG, GENERATED)
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
     SECRET_KEY = os.getenv("SECRET_KEY")
@@ -1,12 +1,42 @@
+import time
 from psycopg2.extras import RealDictCursor
 from Config.Config import Config
+from services.metrics import registry
+from Utils.log import get_logger
 import psycopg2
 
+log = get_logger("db")
+
+query_seconds = registry.histogram(
+    "connext_db_query_seconds", "Time spent in cursor.execute, by statement type", ["statement"]
+)
+_STATEMENTS = {"select", "insert", "update", "delete", "with"}
+
+
+def _statement(query):
+    if isinstance(query, bytes):
+        query = query[:16].decode(errors="ignore")
+    words = str(query).split(None, 1)
+    verb = words[0].lower() if words else ""
+    return verb if verb in _STATEMENTS else "other"
+
+
+class TimedCursor(RealDictCursor):
+    """RealDictCursor that records every execute() in connext_db_query_seconds."""
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            query_seconds.labels(_statement(query)).observe(time.perf_counter() - start)
+
+
 def get_db_connection():
     try:
-        conn =  psycopg2.connect(Config.DB_URL, cursor_factory=RealDictCursor)
-        print("database connected!")
+        conn =  psycopg2.connect(Config.DB_URL, cursor_factory=TimedCursor)
+        log.info("db_connected")
         return conn
     except Exception as e:
-        print("DB CONNECTION ERROR:", e)
+        log.error("db_connect_failed", error=str(e))
         raise  
@@ -1,16 +1,43 @@
 from flask import Blueprint, request, jsonify, make_response
 from flask_jwt_extended import create_access_token, create_refresh_token, set_access_cookies, set_refresh_cookies, jwt_required, get_jwt_identity, get_jwt, unset_jwt_cookies
-from Models.get_db_connection import get_db_connection
 from Utils.hash_password import generate_hash_password, check_hash_password
+from services.password_pool import password_pool, PasswordPoolBusy
+from services.rate_limit import limit_route, login_limiter, register_limiter
+from Utils.log import get_logger
 from datetime import timedelta
 import datetime
-from database.db import fetch_all
+from database.db import get_connection, fetch_one
+from services.user_directory import user_directory
 import json
 import urllib.parse
 
 auth_bp = Blueprint('auth', __name__)
+log = get_logger("routes.auth")
+
+def _busy():
+    response = jsonify({"err": "Server busy, please try again"})
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
+def _upgrade_hash(user, password):
+    """Re-hash at the configured cost after BCRYPT_LOG_ROUNDS changed. Best effort."""
+    try:
+        new_hash = password_pool.hash(password)
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE user_table SET password = %s WHERE uid = %s AND password = %s",
+                (new_hash, user["uid"], user["password"])
+            )
+            conn.commit()
+            cursor.close()
+    except PasswordPoolBusy:
+        pass    # the next login tries again
+    except Exception as e:
+        log.warning("password_rehash_failed", user=user["uid"], error=str(e))
 
 @auth_bp.route('/api/login', methods=['POST'])
+@limit_route(login_limiter, by="ip")
 def login():
     data = request.get_json()
     username = data.get("username", "").strip()
@@ -20,17 +47,21 @@ def login():
         return jsonify({"err": "Username and password required"}), 400
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT uid, username, first_name, last_name, password FROM user_table WHERE username = %s", 
-            (username,)
-        )
-        user = cursor.fetchone()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT uid, username, first_name, last_name, password FROM user_table WHERE username = %s", 
+                (username,)
+            )
+            user = cursor.fetchone()
+            cursor.close()
         
         if not user or not check_hash_password(user["password"], password):
             return jsonify({"err": "Invalid credentials"}), 401
 
+        if password_pool.needs_rehash(user["password"]):
+            _upgrade_hash(user, password)
+
         additional_claims = {
             "uid": user["uid"],
             "username": user["username"],
@@ -54,12 +85,11 @@ def login():
 
         return response
 
-    except Exception as e:
-        print("Login error:", e)
+    except PasswordPoolBusy:
+        return _busy()
+    except Exception:
+        log.exception("login_failed")
         return jsonify({"err": "Server error"}), 500
-    finally:
-        cursor.close()
-        conn.close()
 
 
 @auth_bp.route('/api/refresh', methods=['POST'])
@@ -94,7 +124,7 @@ def refresh():
         
         return response
     except Exception as e:
-        print("Refresh error:", e)
+        log.warning("refresh_failed", error=str(e))
         return jsonify({"err": "Refresh failed"}), 401
 
 @auth_bp.route('/api/logout', methods=['POST'])
@@ -104,6 +134,7 @@ def logout():
     return response
 
 @auth_bp.route("/api/register", methods=["POST"])
+@limit_route(register_limiter, by="ip")
 def register():
     data = request.get_json()
     username = data.get("username").strip()
@@ -116,23 +147,30 @@ def register():
         return jsonify({"err": "All fields are required!"}), 400
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT uid FROM user_table WHERE username = %s", (username,))
-        existing_user = cursor.fetchone()
-        if existing_user:
+        # A taken name is turned away before it costs a bcrypt hash
+        if fetch_one("SELECT uid FROM user_table WHERE username = %s", (username,)):
             return jsonify({"err": "Username already taken"}), 409
 
+        # Hash before taking a database connection so it isn't held for the hash time
         hashed_password = generate_hash_password(password)
 
-        # Insert new user into database
-        cursor.execute(
-            "INSERT INTO user_table (username, password, date_created, gender, first_name, last_name) VALUES (%s, %s, NOW(), %s, %s, %s) RETURNING uid",
-            (username, hashed_password, gender, fname, lname)
-        )
-        new_user_id = cursor.fetchone()["uid"]
-        conn.commit()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+
+            # Insert new user into database; ON CONFLICT covers a name taken while we hashed
+            cursor.execute(
+                "INSERT INTO user_table (username, password, date_created, gender, first_name, last_name) VALUES (%s, %s, NOW(), %s, %s, %s) ON CONFLICT (username) DO NOTHING RETURNING uid",
+                (username, hashed_password, gender, fname, lname)
+            )
+            created = cursor.fetchone()
+            conn.commit()
+            cursor.close()
+
+        if not created:
+            return jsonify({"err": "Username already taken"}), 409
+        new_user_id = created["uid"]
+
+        user_directory.invalidate(new_user_id)
 
         user_data = {
             "id": new_user_id,
@@ -144,14 +182,12 @@ def register():
             "user": user_data
         }), 201
 
+    except PasswordPoolBusy:
+        return _busy()
     except Exception as e:
-        print("REGISTER ERROR:", e)
+        log.exception("register_failed")
         return jsonify({"err": str(e)}), 500
 
-    finally:
-        cursor.close()
-        conn.close()
-
 
 @auth_bp.route("/api/profile", methods=['GET']) 
 @jwt_required()
@@ -159,15 +195,14 @@ def profile():
     try:
         current_user_id = get_jwt_identity()
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT uid, username, first_name, last_name, bio, email, profile_picture_url, date_created FROM user_table WHERE uid = %s", 
-            (int(current_user_id),)
-        )
-        user_data = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT uid, username, first_name, last_name, bio, email, profile_picture_url, date_created FROM user_table WHERE uid = %s", 
+                (int(current_user_id),)
+            )
+            user_data = cursor.fetchone()
+            cursor.close()
 
         
         if user_data:
@@ -175,10 +210,37 @@ def profile():
         else:
             return jsonify({"err": "User not found"}), 404  
             
-    except Exception as e:
-        print("PROFILE ERROR:", e)
+    except Exception:
+        log.exception("profile_failed")
         return jsonify({"err": "Unauthorize Access"}), 500
         
+def _directory_response(exclude=None):
+    """
+    The user directory with a version ETag. A matching If-None-Match gets
+    a 304; ?since=<version> gets only the users changed after that version.
+    """
+    since = request.args.get("since", type=int)
+    if since is not None:
+        version, changed = user_directory.changes_since(since)
+        if changed is not None:
+            if exclude is not None:
+                changed = [u for u in changed if u["uid"] != int(exclude)]
+            return jsonify({"version": version, "full": False, "users": changed})
+        # Too far behind for a delta: fall through to the full list
+        version, users = user_directory.snapshot(exclude=exclude)
+        return jsonify({"version": version, "full": True, "users": users})
+
+    version, users = user_directory.snapshot(exclude=exclude)
+    etag = f"users-{version}-{exclude or 'all'}"
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+    else:
+        response = make_response(jsonify(users))
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.headers["X-Users-Version"] = str(version)
+    return response
+
 @auth_bp.route("/users/<int:id>", methods=["GET"])
 @jwt_required()
 def get_users(id):
@@ -188,22 +250,9 @@ def get_users(id):
         if not current_user_id or not id:
             return jsonify({ "err": "Invalid User"})
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        query = """
-        SELECT uid, username, first_name, last_name, gender, profile_picture_url
-        FROM user_table
-        WHERE uid != %s
-        ORDER BY first_name;
-        """
-        cursor.execute(query, (current_user_id,))
-        users = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        
-        return jsonify(users)
+        return _directory_response(exclude=current_user_id)
     except Exception as e:
-        print(f"❌ Error getting users: {e}")
+        log.exception("get_users_failed")
         return jsonify({"error": str(e)}), 500
     
 @auth_bp.route("/connext_users", methods=["GET"])
@@ -215,21 +264,24 @@ def get_user_map():
         if not current_user_id:
             return jsonify({ "err": "Invalid User"})
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        query = """
-        SELECT uid, username, first_name, last_name, gender, profile_picture_url
-        FROM user_table
-        ORDER BY first_name;
-        """
-        cursor.execute(query, (current_user_id,))
-        users = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        
-        return jsonify(users)
+        return _directory_response()
+    except Exception as e:
+        log.exception("get_users_failed")
+        return jsonify({"error": str(e)}), 500
+
+@auth_bp.route("/users/search", methods=["GET"])
+@jwt_required()
+def search_users():
+    """Ranked name search with ?q=<text>&limit=<n>; without q, the directory page by page via ?cursor=<uid>"""
+    try:
+        prefix = request.args.get("q", "")
+        cursor = request.args.get("cursor", type=int)
+        limit = max(1, min(request.args.get("limit", 50, type=int), 200))
+
+        version, users, next_cursor = user_directory.search(prefix, cursor, limit)
+        return jsonify({"users": users, "next_cursor": next_cursor, "version": version})
     except Exception as e:
-        print(f"❌ Error getting users: {e}")
+        log.exception("user_search_failed")
         return jsonify({"error": str(e)}), 500
     
 
@@ -1,25 +1,45 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from database.db import get_db_connection
-from Utils.rooms import private_room
+from database.db import get_connection
 from extensions import socketio
 from services.online_users import online_manager
-from flask_socketio import emit
-from extensions import fernet
+from services.crypto import message_crypto
+from services.read_receipts import mark_seen, emit_seen
+from services.hydration import hydrate_messages
+from services.user_directory import user_directory
+from Utils.log import get_logger
+
+log = get_logger("routes.messages")
 
 message_bp = Blueprint("message_bp", __name__)
 
-#encrypt all messages
-def decrypt_message(message: str) -> str:
-    return fernet.decrypt(message.encode()).decode()
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
 
-"""get all messages"""
+"""get a page of messages"""
 @message_bp.route("/messages/<int:other_user_id>", methods=["GET"])
 @jwt_required()
 def get_messages(other_user_id):
+    """
+    Keyset-paginated conversation history, newest first.
+
+    Query params:
+      before -- only messages with message_id < before (older page)
+      after  -- only messages with message_id > after (catch up on newer ones)
+      limit  -- page size, capped at MAX_PAGE_SIZE
+
+    Pass `next_cursor` back as `before` (or `after` when paging forward)
+    to get the following page; it is null once there is nothing left.
+
+    message_ids are taken when a message is accepted but become visible
+    when its transaction commits, and concurrent senders (several workers,
+    or the pipeline's batches) don't commit in id order. A lower id can
+    therefore show up after a higher one was already returned, so an
+    `after` cursor can skip it. A client catching up with `after` should
+    start a few messages behind the newest one it holds (say, the 20th
+    newest) and drop the message_ids it already has.
+    """
     uid = get_jwt_identity()
-    conn = get_db_connection()
-    cur = conn.cursor()
 
     if other_user_id == None:
         return jsonify({ "error": "Receiver ID cannot be empty."})
@@ -27,36 +47,69 @@ def get_messages(other_user_id):
     if int(uid) == None:
         return jsonify({ "error": "restricted"})
 
-    cur.execute("""
-        SELECT 
-            m.*,
-            r.message_id AS reply_message_id,
-            r.content AS reply_content,
-            r.sender_id AS reply_sender_id
-        FROM messages m
-        LEFT JOIN messages r
-            ON m.reply_to_message_id = r.message_id
-        WHERE (m.sender_id=%s AND m.receiver_id=%s)
-        OR (m.sender_id=%s AND m.receiver_id=%s)
-        ORDER BY m.date_sent ASC
-
-    """, (uid, other_user_id, other_user_id, uid))
-
-    data = cur.fetchall()
-    cur.close()
-    conn.close()
-
-    messages = []
-    for msg in data:
-        msg["content"] = decrypt_message(msg["content"])
-
-        if msg.get("reply_content"):
-            msg["reply_content"] = decrypt_message(msg["reply_content"])
-
-        messages.append(msg)
-
-
-    return jsonify(messages), 200
+    before = request.args.get("before", type=int)
+    after = request.args.get("after", type=int)
+    limit = request.args.get("limit", DEFAULT_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    if before is not None and after is not None:
+        return jsonify({ "error": "Use either before or after, not both."}), 400
+
+    # message_id is a serial, so it follows acceptance order and doubles as
+    # the keyset cursor without the ties date_sent could have (commit order
+    # can differ, see above).
+    params = {"me": int(uid), "other": other_user_id, "limit": limit + 1}
+    cursor_filter = ""
+    order = "DESC"
+    if before is not None:
+        cursor_filter = "AND message_id < %(cursor)s"
+        params["cursor"] = before
+    elif after is not None:
+        # Walk forward from the cursor so pages stay contiguous, then flip below.
+        cursor_filter = "AND message_id > %(cursor)s"
+        order = "ASC"
+        params["cursor"] = after
+
+    # One LIMITed range scan per direction on messages_pair_history_idx,
+    # so a page costs the same however long the conversation is.
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT m.*
+            FROM (
+                (SELECT * FROM messages
+                 WHERE sender_id = %(me)s AND receiver_id = %(other)s {cursor_filter}
+                 ORDER BY message_id {order} LIMIT %(limit)s)
+                UNION ALL
+                (SELECT * FROM messages
+                 WHERE sender_id = %(other)s AND receiver_id = %(me)s {cursor_filter}
+                   AND sender_id <> receiver_id
+                 ORDER BY message_id {order} LIMIT %(limit)s)
+            ) m
+            ORDER BY m.message_id {order}
+            LIMIT %(limit)s
+        """, params)
+
+        data = cur.fetchall()
+        has_more = len(data) > limit
+        messages = data[:limit]
+
+        # Plaintext, reply previews and reactions in a fixed number of batched queries
+        hydrate_messages(cur, messages)
+        cur.close()
+
+    if order == "ASC":
+        messages.reverse()
+
+    next_cursor = None
+    if has_more and messages:
+        next_cursor = messages[0]["message_id"] if after is not None else messages[-1]["message_id"]
+
+    return jsonify({
+        "messages": messages,
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+    }), 200
 
 
 @message_bp.route("/latest-messages", methods=["GET"])
@@ -69,62 +122,45 @@ def get_latest_messages():
         if current_user_id == None:
             return jsonify({ "error": "Unauthorize"})
         
-        # Get a fresh database connection
-        conn = get_db_connection()
-        temp_cursor = conn.cursor()
-        
+        # One row per conversation, maintained by services/conversations.py
         query = """
-        WITH LatestMessages AS (
-            SELECT 
-                m.*,
-                CASE 
-                    WHEN m.sender_id = %s THEN m.receiver_id
-                    ELSE m.sender_id
-                END as other_user_id,
-                ROW_NUMBER() OVER (
-                    PARTITION BY 
-                        CASE 
-                            WHEN m.sender_id = %s THEN m.receiver_id
-                            ELSE m.sender_id
-                        END 
-                    ORDER BY m.date_sent DESC
-                ) as rn
-            FROM messages m
-            WHERE m.sender_id = %s OR m.receiver_id = %s
-        )
         SELECT 
-            lm.message_id,
-            lm.sender_id,
-            lm.receiver_id,
-            lm.content,
-            lm.is_seen,
-            lm.date_sent,
-            lm.other_user_id,
+            c.last_message_id AS message_id,
+            c.last_sender_id AS sender_id,
+            c.last_receiver_id AS receiver_id,
+            c.last_content AS content,
+            c.last_is_seen AS is_seen,
+            c.last_date_sent AS date_sent,
+            c.other_user_id,
+            c.unread_count,
             u.first_name,
             u.last_name,
             u.username
-        FROM LatestMessages lm
-        LEFT JOIN user_table u ON u.uid = lm.other_user_id
-        WHERE lm.rn = 1
-        ORDER BY lm.date_sent DESC;
+        FROM (
+            SELECT *, user_high AS other_user_id, unread_low AS unread_count
+            FROM conversations WHERE user_low = %(uid)s
+            UNION ALL
+            SELECT *, user_low AS other_user_id, unread_high AS unread_count
+            FROM conversations WHERE user_high = %(uid)s AND user_low <> %(uid)s
+        ) c
+        LEFT JOIN user_table u ON u.uid = c.other_user_id
+        ORDER BY c.last_date_sent DESC;
         """
         
-        temp_cursor.execute(query, (current_user_id, current_user_id, current_user_id, current_user_id))
-        messages = temp_cursor.fetchall()
-        msg = []
-        for message in messages:
-            message["content"] = decrypt_message(message["content"])
-            msg.append(message)
-        temp_cursor.close()
-        conn.close()
+        with get_connection() as conn:
+            temp_cursor = conn.cursor()
+            temp_cursor.execute(query, {"uid": int(current_user_id)})
+            messages = temp_cursor.fetchall()
+            temp_cursor.close()
+
+        message_crypto.decrypt_rows(messages)
 
         
         
         return jsonify(messages)
         
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        log.exception("latest_messages_failed")
         return jsonify({"error": str(e)}), 500
     
 @message_bp.route("/online-status/<int:user_id>", methods=["GET"])
@@ -148,16 +184,14 @@ def get_user_info(user_id):
         # Prevent users from accessing other users' info arbitrarily
         # (You might want to implement friend/contact logic here)
         
-        conn = get_db_connection()
-        temp_cursor = conn.cursor()
-        
-        temp_cursor.execute(
-            "SELECT uid, username, first_name, last_name FROM user_table WHERE uid = %s",
-            (user_id,)
-        )
-        user = temp_cursor.fetchone()
-        temp_cursor.close()
-        conn.close()
+        with get_connection() as conn:
+            temp_cursor = conn.cursor()
+            temp_cursor.execute(
+                "SELECT uid, username, first_name, last_name FROM user_table WHERE uid = %s",
+                (user_id,)
+            )
+            user = temp_cursor.fetchone()
+            temp_cursor.close()
         
         if not user:
             return jsonify({"error": "User not found"}), 404
@@ -178,32 +212,15 @@ def mark_as_seen(sender_id):
         if current_user_id == None:
             return jsonify({ "error": "Unauthorize"})
 
-        conn = get_db_connection()
-        temp_cursor = conn.cursor()
+        with get_connection() as conn:
+            temp_cursor = conn.cursor()
+            seen_count, seen_up_to = mark_seen(temp_cursor, current_user_id, sender_id)
+            conn.commit()
+            temp_cursor.close()
         
-        update_query = """
-        UPDATE messages 
-        SET is_seen = TRUE 
-        WHERE sender_id = %s 
-        AND receiver_id = %s 
-        AND is_seen = FALSE
-        RETURNING message_id, sender_id, receiver_id, content
-        """
-        
-        temp_cursor.execute(update_query, (sender_id, current_user_id))
-        updated = temp_cursor.fetchall()
-        conn.commit()
-        temp_cursor.close()
-        conn.close()
-        
-        if updated:
-            room_name = private_room(sender_id, current_user_id)
-            emit("messages_seen", {
-                "sender_id": sender_id,
-                "receiver_id": current_user_id,
-                "updated_count": len(updated)
-            }, room=room_name, namespace='/')
-        return jsonify({"success": True, "updated": len(updated)})
+        if seen_count:
+            emit_seen(socketio, current_user_id, sender_id, seen_count, seen_up_to)
+        return jsonify({"success": True, "updated": seen_count, "seen_up_to": seen_up_to})
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -213,21 +230,21 @@ def mark_as_seen(sender_id):
 @jwt_required()
 def avatar():
     uid = get_jwt_identity()
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
 
     avatar_url = request.get_json("avatar_url")
     if not avatar_url:
         return {"error": "No avatar_url provided"}, 400
     
     
-    cursor.execute(
-        "UPDATE user_table SET profile_picture_url = %s WHERE uid = %s",
-        (avatar_url, uid)
-    )
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE user_table SET profile_picture_url = %s WHERE uid = %s",
+            (avatar_url, uid)
+        )
+        conn.commit()
+        cursor.close()
+
+    user_directory.invalidate(uid)
 
     return {"profile_picture_url": avatar_url}, 200
\ No newline at end of file
@@ -0,0 +1,35 @@
+import hmac
+import time
+from flask import Blueprint, Response, request, g
+from Config.Config import Config
+from services.metrics import registry
+
+metrics_bp = Blueprint("metrics", __name__)
+
+route_seconds = registry.histogram(
+    "connext_http_request_seconds", "HTTP handler time by route", ["method", "route", "status"]
+)
+
+
+@metrics_bp.before_app_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+
+@metrics_bp.after_app_request
+def _record_latency(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        # The URL rule, not the path, so /users/<int:id> is one series
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        route_seconds.labels(request.method, route, response.status_code).observe(time.perf_counter() - started)
+    return response
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics():
+    if Config.METRICS_TOKEN:
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        if not hmac.compare_digest(supplied, Config.METRICS_TOKEN):
+            return Response("unauthorized\n", status=401, mimetype="text/plain")
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
@@ -1,21 +1,27 @@
 from flask import jsonify
 import re
-from extensions import bcrypt
+from services.password_pool import password_pool, PasswordPoolBusy
+from Utils.log import get_logger
+
+log = get_logger("passwords")
 
 def check_hash_password(stored_hash: str, password: str) -> bool:
     """
     Returns True if password matches the hash, False otherwise.
+    Raises PasswordPoolBusy when the hashing pool is overloaded.
     """
     try:
-        return bcrypt.check_password_hash(stored_hash, password)
+        return password_pool.check(stored_hash, password)
+    except PasswordPoolBusy:
+        raise
     except Exception as e:
-        print("Password check error:", e)
+        log.warning("password_check_error", error=str(e))
         return False
 
 def generate_hash_password(password: str) -> str:
     """
     Validates password rules and returns hashed password.
-    Raises ValueError if password invalid.
+    Raises ValueError if password invalid, PasswordPoolBusy when overloaded.
     """
     rules = [
         (r".{8,}", "Password must be at least 8 characters long."),
@@ -30,5 +36,4 @@ def generate_hash_password(password: str) -> str:
             raise ValueError(err_message)
 
     # password valid → hash it
-    hashed = bcrypt.generate_password_hash(password).decode("utf-8")
-    return hashed
+    return password_pool.hash(password)
@@ -0,0 +1,33 @@
+"""
+JSON for Socket.IO packets, handed to SocketIO(json=...).
+
+Uses orjson when it is installed (several times faster than the standard
+library on message payloads, and it writes UTF-8 instead of \\u escapes),
+the standard json module otherwise. python-socketio only ever calls
+dumps(obj, separators=...) and loads(text).
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+NAME = "orjson" if orjson is not None else "json"
+
+
+def dumps(obj, **kwargs):
+    if orjson is not None:
+        try:
+            # orjson's output is always compact, so `separators` needs no handling
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+        except TypeError:
+            # e.g. ints past 64 bits, which the standard library still encodes
+            pass
+    return json.dumps(obj, **kwargs)
+
+
+def loads(text, **kwargs):
+    if orjson is not None and not kwargs:
+        return orjson.loads(text)
+    return json.loads(text, **kwargs)
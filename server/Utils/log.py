@@ -0,0 +1,134 @@
+"""
+Leveled, structured, rate-limited logging.
+
+    log = get_logger("sockets.messaging")
+    log.info("message_saved", sender=sender_id, receiver=receiver_id)
+    log.exception("send_failed", sender=sender_id)
+
+A record is one line of key=value pairs (or JSON with LOG_FORMAT=json).
+Records go through a queue and a single writer thread, so handlers never
+block on stdout. Each (logger, event) pair may log LOG_RATE_LIMIT times per
+LOG_RATE_WINDOW seconds; the rest are dropped and the next one that gets
+through carries `suppressed=<count>`.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from Config.Config import Config
+
+_setup_lock = threading.Lock()
+_listener = None
+
+
+def _text(value):
+    value = str(value)
+    if not value or any(c in value for c in ' "=\n'):
+        return json.dumps(value)
+    return value
+
+
+class _Formatter(logging.Formatter):
+    def format(self, record):
+        fields = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_info:
+            fields["exc"] = self.formatException(record.exc_info)
+        if Config.LOG_FORMAT == "json":
+            return json.dumps(fields, default=str)
+        return " ".join(f"{k}={_text(v)}" for k, v in fields.items())
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Same process: hand the record over as is and let the writer thread
+        # format it (the stock prepare() flattens fields and traceback early)
+        return record
+
+
+class _RateLimit(logging.Filter):
+    def __init__(self, limit, window):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.seen = {}              # (logger, event) -> [window start, logged, suppressed]
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.seen.get(key)
+            if entry is None or now - entry[0] >= self.window:
+                suppressed = entry[2] if entry else 0
+                entry = self.seen[key] = [now, 0, 0]
+                if suppressed:
+                    record.fields = {**getattr(record, "fields", {}), "suppressed": suppressed}
+                if len(self.seen) > 10_000:
+                    self.seen = {k: v for k, v in self.seen.items() if now - v[0] < self.window}
+            if entry[1] >= self.limit:
+                entry[2] += 1
+                return False
+            entry[1] += 1
+            return True
+
+
+def _setup():
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+        stream = logging.StreamHandler()
+        stream.setFormatter(_Formatter())
+        records = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(records, stream)
+        _listener.start()
+        # Drain what is still queued when the process exits (CLI tools log and quit)
+        atexit.register(_listener.stop)
+
+        handler = _QueueHandler(records)
+        handler.addFilter(_RateLimit(Config.LOG_RATE_LIMIT, Config.LOG_RATE_WINDOW))
+        root = logging.getLogger("connext")
+        root.addHandler(handler)
+        root.setLevel(Config.LOG_LEVEL.upper())
+        root.propagate = False
+
+
+class StructuredLogger:
+    """logging.Logger with keyword fields: log.info("event", key=value)."""
+
+    def __init__(self, logger):
+        self.logger = logger
+
+    def _log(self, level, event, fields, exc_info=False):
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, event, exc_info=exc_info, extra={"fields": fields})
+
+    def debug(self, event, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event, **fields):
+        self._log(logging.ERROR, event, fields)
+
+    def exception(self, event, **fields):
+        """ERROR with the current traceback."""
+        self._log(logging.ERROR, event, fields, exc_info=True)
+
+
+def get_logger(name):
+    _setup()
+    return StructuredLogger(logging.getLogger(f"connext.{name}"))
@@ -2,3 +2,12 @@ def private_room(user1, user2):
     user1 = int(user1)
     user2 = int(user2)
     return f"room_{min(user1, user2)}_{max(user1, user2)}"
+
+
+def message_rooms(sender, receiver):
+    """
+    Where a new message goes: the pair's chat room and both users' own
+    rooms. Emitting to all of them at once sends each socket one packet,
+    however many of the rooms it is in.
+    """
+    return list(dict.fromkeys((private_room(sender, receiver), f"user_{receiver}", f"user_{sender}")))
@@ -0,0 +1,85 @@
+"""
+Benchmark for password hashing (services/password_pool.py).
+
+1. Time one bcrypt hash at each cost factor, to pick BCRYPT_LOG_ROUNDS.
+2. Under eventlet, run --logins concurrent password checks twice, once in
+   the greenlets themselves and once through the pool, while a ticker
+   greenlet measures how long the hub was stalled.
+
+    python -m benchmarks.bcrypt_cost
+    python -m benchmarks.bcrypt_cost --costs 10 11 12 13 --logins 20 --workers 4
+"""
+import eventlet
+eventlet.monkey_patch()
+
+import argparse
+import time
+from extensions import bcrypt
+from services.password_pool import PasswordPool
+
+PASSWORD = "Benchmark#Passw0rd"
+
+
+def time_costs(costs, repeat):
+    print("cost   hash ms   check ms")
+    for cost in costs:
+        hashed = bcrypt.generate_password_hash(PASSWORD, cost)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            bcrypt.generate_password_hash(PASSWORD, cost)
+        hash_ms = (time.perf_counter() - start) / repeat * 1000
+        start = time.perf_counter()
+        for _ in range(repeat):
+            bcrypt.check_password_hash(hashed, PASSWORD)
+        check_ms = (time.perf_counter() - start) / repeat * 1000
+        print(f"{cost:>4}   {hash_ms:>7.1f}   {check_ms:>8.1f}")
+
+
+def hub_stall(check, logins, tick=0.01):
+    """Run `logins` checks concurrently; return (wall seconds, worst hub stall in ms)."""
+    worst = [0.0]
+    running = [True]
+
+    def ticker():
+        while running[0]:
+            before = time.perf_counter()
+            eventlet.sleep(tick)
+            worst[0] = max(worst[0], (time.perf_counter() - before - tick) * 1000)
+
+    ticking = eventlet.spawn(ticker)
+    eventlet.sleep(0)
+    start = time.perf_counter()
+    pool = eventlet.GreenPool(logins)
+    for _ in range(logins):
+        pool.spawn(check)
+    pool.waitall()
+    wall = time.perf_counter() - start
+    running[0] = False
+    ticking.wait()
+    return wall, worst[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--costs", type=int, nargs="+", default=[10, 11, 12, 13])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--cost", type=int, default=12, help="cost for the concurrency run")
+    parser.add_argument("--logins", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    time_costs(args.costs, args.repeat)
+
+    hashed = bcrypt.generate_password_hash(PASSWORD, args.cost)
+    pool = PasswordPool(rounds=args.cost, workers=args.workers, max_queue=args.logins, timeout=60)
+
+    print(f"\n{args.logins} concurrent logins at cost {args.cost}")
+    wall, stall = hub_stall(lambda: bcrypt.check_password_hash(hashed, PASSWORD), args.logins)
+    print(f"in greenlet         {wall:6.2f} s wall   worst hub stall {stall:8.1f} ms")
+    wall, stall = hub_stall(lambda: pool.check(hashed, PASSWORD), args.logins)
+    print(f"pool ({args.workers} workers)    {wall:6.2f} s wall   worst hub stall {stall:8.1f} ms")
+    print(pool.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""
+End-to-end Socket.IO load test.
+
+Starts the app from wsgi.py in a subprocess (eventlet, as in production)
+against the database in DB_URL, or targets a running server with --url.
+Registers --users users in pairs and connects one python-socketio client
+for each. For --duration seconds every client sends typing_start and
+send_message to its partner --rate times a second; on receiving a message
+it reacts to one in --react-every and marks the chat seen every
+--seen-every messages.
+
+Reported: delivered messages/sec, delivery latency (send_message until
+the partner's new_message) p50/p99/max, error events, and the server's CPU
+and RSS. Results are written as JSON to --out; with --baseline the run
+fails (exit code 1) when throughput dropped or p99 latency rose by more
+than --tolerance against an earlier result.
+
+Use a throwaway database: the run registers users and writes messages.
+
+    python -m benchmarks.load_test --users 50 --duration 30
+    python -m benchmarks.load_test --url http://localhost:5000 --server-pid 1234
+    python -m benchmarks.load_test --baseline benchmarks/results/load-v1.json
+
+Needs `requests` and `websocket-client` (pip install requests websocket-client).
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+try:
+    import requests
+    import socketio
+    import websocket  # noqa: F401  (websocket transport for the client)
+except ImportError as e:
+    raise SystemExit(f"load_test needs `requests` and `websocket-client` ({e}); pip install requests websocket-client")
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER = (
+    "import wsgi; "
+    "wsgi.socketio.run(wsgi.app, host='127.0.0.1', port={port}, log_output=False, use_reloader=False)"
+)
+# Limits meant for real users would throttle the simulated ones
+SERVER_ENV = {
+    "BCRYPT_LOG_ROUNDS": "4",
+    "LOG_LEVEL": "WARNING",
+    **{f"RATE_LIMIT_{name}_{kind}": "1000000"
+       for name in ("LOGIN", "REGISTER", "SEND", "REACTION", "EDIT") for kind in ("RATE", "BURST")},
+}
+PASSWORD = "LoadTest#1"
+
+
+# ---------------- server process ----------------
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server():
+    port = _free_port()
+    env = {**os.environ, **SERVER_ENV}
+    proc = subprocess.Popen(
+        [sys.executable, "-c", SERVER.format(port=port)],
+        cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"server exited:\n{proc.stderr.read().decode(errors='replace')}")
+        try:
+            requests.get(f"{url}/online-status/0", timeout=1)
+            return proc, url
+        except requests.RequestException:
+            time.sleep(0.3)
+    proc.kill()
+    raise SystemExit("server did not come up within 60s")
+
+
+class ResourceSampler:
+    """CPU% and RSS of a process, sampled once a second from /proc (or psutil)."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.cpu = []
+        self.rss = []
+        self.stop = threading.Event()
+        self.ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    def _read(self):
+        try:
+            import psutil
+            proc = psutil.Process(self.pid)
+            times = proc.cpu_times()
+            return times.user + times.system, proc.memory_info().rss
+        except ImportError:
+            with open(f"/proc/{self.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            cpu = (int(fields[11]) + int(fields[12])) / self.ticks
+            return cpu, int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+
+    def run(self):
+        last_cpu, last_t = self._read()[0], time.monotonic()
+        while not self.stop.wait(1):
+            try:
+                cpu, rss = self._read()
+            except Exception:
+                return
+            now = time.monotonic()
+            self.cpu.append((cpu - last_cpu) / (now - last_t) * 100)
+            self.rss.append(rss)
+            last_cpu, last_t = cpu, now
+
+    def summary(self):
+        if not self.cpu:
+            return None
+        return {
+            "cpu_avg_percent": round(statistics.mean(self.cpu), 1),
+            "cpu_max_percent": round(max(self.cpu), 1),
+            "rss_max_mb": round(max(self.rss) / 2**20, 1),
+        }
+
+
+# ---------------- simulated users ----------------
+class SimUser:
+    def __init__(self, url, username, args, stats):
+        self.url = url
+        self.username = username
+        self.args = args
+        self.stats = stats
+        self.uid = None
+        self.partner = None
+        self.cookie = None
+        self.sent = {}              # nonce -> perf_counter at send
+        self.received = 0
+        self.sio = socketio.Client(reconnection=False)
+        self.sio.on("new_message", self._on_message)
+        for event in ("error", "message_error", "rate_limited", "message_failed"):
+            self.sio.on(event, lambda data, event=event: self.stats.error(event))
+
+    def login(self):
+        http = requests.Session()
+        r = http.post(f"{self.url}/api/register", json={
+            "username": self.username, "password": PASSWORD, "gender": "other",
+            "first_name": "Load", "last_name": self.username,
+        })
+        if r.status_code not in (201, 409):
+            raise RuntimeError(f"register {self.username}: {r.status_code} {r.text}")
+        r = http.post(f"{self.url}/api/login", json={"username": self.username, "password": PASSWORD})
+        if r.status_code != 204:
+            raise RuntimeError(f"login {self.username}: {r.status_code} {r.text}")
+        # The cookies are Secure; pass the token by hand so plain http works too
+        self.cookie = f"access_token_cookie={r.cookies['access_token_cookie']}"
+        self.uid = str(http.get(f"{self.url}/api/profile", headers={"Cookie": self.cookie}).json()["uid"])
+
+    def connect(self):
+        self.sio.connect(self.url, headers={"Cookie": self.cookie}, transports=["websocket"], wait_timeout=10)
+        self.sio.emit("join_private", {"user1": self.uid, "user2": self.partner})
+
+    def _on_message(self, message):
+        if str(message.get("sender_id")) != self.partner:
+            return
+        nonce = message.get("content", "").rsplit(" ", 1)[-1]
+        started = self.partner_user.sent.pop(nonce, None)
+        if started is not None:
+            self.stats.delivered(time.perf_counter() - started)
+        self.received += 1
+        if self.args.react_every and self.received % self.args.react_every == 0:
+            self.sio.emit("add_reaction", {"message_id": message["message_id"], "reaction_type": "like"})
+        if self.args.seen_every and self.received % self.args.seen_every == 0:
+            self.sio.emit("mark_as_seen", {"sender_id": self.partner})
+
+    def run(self, stop):
+        interval = 1.0 / self.args.rate
+        seq = 0
+        next_send = time.monotonic()
+        while not stop.is_set():
+            seq += 1
+            nonce = f"{self.uid}-{seq}"
+            self.sio.emit("typing_start", {"receiver_id": self.partner})
+            self.sent[nonce] = time.perf_counter()
+            self.sio.emit("send_message", {"receiver_id": self.partner, "content": f"load test {nonce}"})
+            self.stats.sent()
+            next_send += interval
+            stop.wait(max(0, next_send - time.monotonic()))
+
+    def close(self):
+        try:
+            self.sio.disconnect()
+        except Exception:
+            pass
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.sent_count = 0
+        self.errors = {}
+        self.recording = False
+
+    def sent(self):
+        if self.recording:
+            with self.lock:
+                self.sent_count += 1
+
+    def delivered(self, seconds):
+        if self.recording:
+            with self.lock:
+                self.latencies.append(seconds)
+
+    def error(self, event):
+        with self.lock:
+            self.errors[event] = self.errors.get(event, 0) + 1
+
+
+def _percentile(values, q):
+    return values[min(len(values) - 1, int(len(values) * q))] if values else None
+
+
+def run_load(url, args):
+    stats = Stats()
+    run_id = uuid.uuid4().hex[:6]
+    users = [SimUser(url, f"lt_{run_id}_{i}", args, stats) for i in range(args.users - args.users % 2)]
+    for user in users:
+        user.login()
+    for a, b in zip(users[::2], users[1::2]):
+        a.partner, b.partner = b.uid, a.uid
+        a.partner_user, b.partner_user = b, a
+    for user in users:
+        user.connect()
+
+    stop = threading.Event()
+    threads = [threading.Thread(target=user.run, args=(stop,), daemon=True) for user in users]
+    for thread in threads:
+        thread.start()
+
+    time.sleep(args.warmup)
+    stats.recording = True
+    started = time.perf_counter()
+    time.sleep(args.duration)
+    stats.recording = False
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=5)
+    time.sleep(1)                   # let in-flight deliveries land
+    for user in users:
+        user.close()
+
+    latencies = sorted(stats.latencies)
+    return {
+        "clients": len(users),
+        "sent": stats.sent_count,
+        "delivered": len(latencies),
+        "messages_per_sec": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+            "p99": round(_percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+            "max": round(latencies[-1] * 1000, 2) if latencies else None,
+        },
+        "errors": stats.errors,
+    }
+
+
+def compare(result, baseline, tolerance):
+    """Regressions of `result` against `baseline`, as readable strings."""
+    regressions = []
+    old, new = baseline["results"], result["results"]
+    if new["messages_per_sec"] < old["messages_per_sec"] * (1 - tolerance):
+        regressions.append(f"messages/sec {old['messages_per_sec']} -> {new['messages_per_sec']}")
+    old_p99, new_p99 = old["latency_ms"]["p99"], new["latency_ms"]["p99"]
+    if old_p99 and new_p99 and new_p99 > old_p99 * (1 + tolerance):
+        regressions.append(f"p99 latency {old_p99} ms -> {new_p99} ms")
+    return regressions
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="target a running server instead of starting one")
+    parser.add_argument("--server-pid", type=int, help="with --url: sample this process's CPU/RSS")
+    parser.add_argument("--users", type=int, default=20, help="simulated users (paired up)")
+    parser.add_argument("--rate", type=float, default=2, help="messages per second per user")
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds of load before measuring")
+    parser.add_argument("--react-every", type=int, default=5)
+    parser.add_argument("--seen-every", type=int, default=10)
+    parser.add_argument("--out", default=os.path.join(SERVER_DIR, "benchmarks", "results",
+                                                      f"load-{datetime.now():%Y%m%d-%H%M%S}.json"))
+    parser.add_argument("--baseline", help="earlier result JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression")
+    args = parser.parse_args()
+
+    proc = None
+    if args.url:
+        url, pid = args.url.rstrip("/"), args.server_pid
+    else:
+        proc, url = start_server()
+        pid = proc.pid
+
+    sampler = ResourceSampler(pid) if pid else None
+    if sampler:
+        threading.Thread(target=sampler.run, daemon=True).start()
+    try:
+        results = run_load(url, args)
+    finally:
+        if sampler:
+            sampler.stop.set()
+        if proc:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    results["server"] = sampler.summary() if sampler else None
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "revision": _git_revision(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+        "results": results,
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"saved {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"❌ regression: {line}")
+        if regressions:
+            sys.exit(1)
+        print("✅ no regression against baseline")
+
+
+if __name__ == "__main__":
+    main()
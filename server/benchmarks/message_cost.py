@@ -0,0 +1,317 @@
+"""
+Microbenchmarks for the CPU a single message costs the server.
+
+Sockets and the database aside, every send_message pays for a Fernet
+encrypt, a reply preview decrypt, a pytz lookup, datetime.isoformat(),
+message_rooms() and the Socket.IO serialization of its payload;
+edit_message and get_messages pay for their own share. Each of those steps
+is timed on its own, next to the whole CPU path of the handler it belongs
+to. That path goes through the functions the handler itself calls
+(services/message_events.py, services/hydration.py), with only the
+database and the sends left out, so an optimization can be checked
+against numbers:
+
+    group          handler
+    send_message   sockets/messaging.handle_send_message
+    edit_message   sockets/edit.handle_edit_message
+    get_messages   Routes/message_routes1.get_messages (a --page sized page)
+
+Every case is calibrated to run for about --min-time per round and is
+timed for --rounds rounds; min/median/mean/stddev are per call, in µs.
+--save writes the results as JSON and --compare fails (exit code 1) when
+a case's median got slower than --tolerance against a saved run.
+
+    python -m benchmarks.message_cost
+    python -m benchmarks.message_cost -k send_message --rounds 20
+    python -m benchmarks.message_cost --save benchmarks/results/cost-before.json
+    python -m benchmarks.message_cost --compare benchmarks/results/cost-before.json
+"""
+import argparse
+import fnmatch
+import json
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+import pytz
+from flask import Flask
+from socketio import packet
+from extensions import fernet
+from Utils import json_codec
+from Utils.rooms import private_room, message_rooms
+from services import hydration, message_events
+from services.crypto import MessageCrypto
+from services.message_cache import MessageCache
+
+TIMEZONE = "Asia/Manila"
+SENDER, RECEIVER = "1042", "877"
+CONTENT = "Running a bit late, be there in 10! Save me a seat please 🙏"
+
+
+# ---------------- harness ----------------
+class Case:
+    def __init__(self, group, name, fn):
+        self.group = group
+        self.name = name
+        self.fn = fn
+
+    @property
+    def id(self):
+        return f"{self.group}.{self.name}"
+
+
+def _calibrate(fn, min_time):
+    """Calls per round so that one round takes at least `min_time` seconds."""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return loops
+        loops *= 10 if elapsed < min_time / 10 else 2
+
+
+def run_case(case, rounds, min_time):
+    loops = _calibrate(case.fn, min_time)
+    fn = case.fn
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - start) / loops * 1e6)
+    return {
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.mean(samples),
+        "stddev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "loops": loops,
+        "rounds": rounds,
+    }
+
+
+# ---------------- fixtures ----------------
+# SocketIO(json=...) in extensions.py swaps the codec on packet.Packet
+# itself, so both sides of the comparison get a class of their own
+class _StdlibPacket(packet.Packet):
+    json = json
+
+
+class _FastPacket(packet.Packet):
+    json = json_codec
+
+
+def _encode(event, payload, packet_class=_StdlibPacket):
+    # What every emit does once before the per-socket sends
+    return packet_class(packet.EVENT, data=[event, payload], namespace="/").encode()
+
+
+class _NoRows:
+    """Stands in for the cursor: no reply target off the page, no reactions."""
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchall(self):
+        return []
+
+
+def _send_message_cases(crypto):
+    tz = pytz.timezone(TIMEZONE)
+    token = crypto.encrypt(CONTENT)
+    reply_row = {"message_id": 41, "sender_id": int(RECEIVER), "content": crypto.encrypt("Where are you?")}
+    saved = {"message_id": 42, "sender_id": int(SENDER), "receiver_id": int(RECEIVER),
+             "reply_to_message_id": 41, "is_seen": False}
+    date_sent = message_events.sent_at()
+
+    def payload_of():
+        return message_events.new_message(saved, CONTENT, date_sent, reply_row, crypto=crypto)
+
+    payload = payload_of()
+    list_update = {"type": "new_message", "sender_id": SENDER, "receiver_id": RECEIVER, "message": payload}
+
+    def three_emits():
+        # What send_message did before the single fan-out emit
+        _encode("new_message", payload)
+        _encode("user_list_update", list_update)
+        _encode("user_list_update", list_update)
+
+    def handler():
+        # handle_send_message's steps, in order, minus the INSERT and the sends
+        encrypted = crypto.encrypt(CONTENT)
+        sent = message_events.sent_at()
+        crypto.cache.put(saved["message_id"], encrypted, CONTENT)
+        data = message_events.new_message(saved, CONTENT, sent, reply_row, crypto=crypto)
+        _encode("new_message", data, _FastPacket)
+        return message_rooms(SENDER, RECEIVER)
+
+    group = "send_message"
+    return [
+        Case(group, "fernet_encrypt", lambda: crypto.encrypt(CONTENT)),
+        Case(group, "fernet_decrypt", lambda: crypto.decrypt(token)),
+        Case(group, "reply_decrypt_cached", lambda: crypto.decrypt_message(reply_row["message_id"], reply_row["content"])),
+        Case(group, "pytz_timezone", lambda: pytz.timezone(TIMEZONE)),
+        Case(group, "now_isoformat", lambda: datetime.now(tz).isoformat()),
+        Case(group, "sent_at", message_events.sent_at),
+        Case(group, "private_room", lambda: private_room(SENDER, RECEIVER)),
+        Case(group, "new_message_payload", payload_of),
+        Case(group, "message_rooms", lambda: message_rooms(SENDER, RECEIVER)),
+        Case(group, "serialize_one_emit", lambda: _encode("new_message", payload)),
+        Case(group, "serialize_three_emits", three_emits),
+        Case(group, f"serialize_fanout_{json_codec.NAME}", lambda: _encode("new_message", payload, _FastPacket)),
+        Case(group, "handler_cpu_path", handler),
+    ]
+
+
+def _edit_message_cases(crypto):
+    updated = {"message_id": 42, "sender_id": int(SENDER), "receiver_id": int(RECEIVER),
+               "is_edited": True, "edited_at": None}
+
+    def handler():
+        # handle_edit_message's steps, in order, minus the UPDATE and the send
+        stamp = message_events.edited_at()
+        encrypted = crypto.encrypt(CONTENT)
+        crypto.cache.invalidate(updated["message_id"])
+        crypto.cache.put(updated["message_id"], encrypted, CONTENT)
+        room = private_room(updated["sender_id"], updated["receiver_id"])
+        _encode("message_edited", message_events.message_edited(updated, CONTENT, stamp), _FastPacket)
+        return room
+
+    group = "edit_message"
+    return [
+        Case(group, "edited_at", message_events.edited_at),
+        Case(group, "fernet_encrypt", lambda: crypto.encrypt(CONTENT)),
+        Case(group, "payload", lambda: message_events.message_edited(updated, CONTENT, "10:42 AM 07")),
+        Case(group, "handler_cpu_path", handler),
+    ]
+
+
+def _history_page(crypto, size, seed=7):
+    """Rows as the page query returns them: encrypted content, datetime date_sent."""
+    rng = random.Random(seed)
+    start = datetime(2025, 3, 1, 9, 0, tzinfo=pytz.timezone(TIMEZONE))
+    rows = []
+    for i in range(size):
+        mid = 10_000 + i
+        rows.append({
+            "message_id": mid,
+            "sender_id": int(rng.choice((SENDER, RECEIVER))),
+            "receiver_id": int(RECEIVER),
+            "content": crypto.encrypt(f"{CONTENT} #{i}"),
+            "reply_to_message_id": mid - rng.randint(1, 5) if i > 5 and rng.random() < 0.2 else None,
+            "is_seen": True,
+            "is_edited": False,
+            "edited_at": None,
+            "date_sent": start + timedelta(minutes=i),
+        })
+    return rows
+
+
+def _attach(crypto, rows):
+    """hydrate_messages past decryption: reply previews and (no) reactions."""
+    hydration._attach_replies(_NoRows(), rows, crypto)
+    hydration._attach_reactions(_NoRows(), rows)
+    return rows
+
+
+def _get_messages_cases(crypto, size):
+    app = Flask(__name__)
+    page = _history_page(crypto, size)
+    cold = MessageCrypto(fernet, MessageCache(max_size=0))
+
+    warm_page = crypto.decrypt_rows([dict(row) for row in page])      # also fills the cache
+    body = {"messages": _attach(crypto, [dict(row) for row in warm_page]), "next_cursor": None, "has_more": False}
+
+    def handler():
+        # get_messages past the page query: hydrate, then what jsonify() does
+        rows = hydration.hydrate_messages(_NoRows(), [dict(row) for row in page], crypto)
+        return app.json.dumps({"messages": rows, "next_cursor": rows[-1]["message_id"], "has_more": True})
+
+    group = "get_messages"
+    return [
+        Case(group, "decrypt_page_cold", lambda: cold.decrypt_rows([dict(row) for row in page])),
+        Case(group, "decrypt_page_cached", lambda: crypto.decrypt_rows([dict(row) for row in page])),
+        Case(group, "attach_replies", lambda: _attach(crypto, [dict(row) for row in warm_page])),
+        Case(group, "jsonify_page", lambda: app.json.dumps(body)),
+        Case(group, "handler_cpu_path", handler),
+    ]
+
+
+def build_cases(page_size):
+    # A private cache so the numbers don't depend on the process-wide one
+    crypto = MessageCrypto(fernet, MessageCache(max_size=10_000))
+    return (
+        _send_message_cases(crypto)
+        + _edit_message_cases(crypto)
+        + _get_messages_cases(crypto, page_size)
+    )
+
+
+# ---------------- report ----------------
+def _report(results):
+    print(f"{'case':<40}{'min':>10}{'median':>10}{'mean':>10}{'stddev':>10}{'ops/s':>12}")
+    group = None
+    for case_id, stats in results.items():
+        if case_id.split(".")[0] != group:
+            group = case_id.split(".")[0]
+            print(f"-- {group}")
+        print(f"  {case_id.split('.', 1)[1]:<38}"
+              f"{stats['min']:>10.2f}{stats['median']:>10.2f}{stats['mean']:>10.2f}{stats['stddev']:>10.2f}"
+              f"{1e6 / stats['median']:>12,.0f}")
+    print("(µs per call)")
+
+
+def _compare(results, baseline, tolerance):
+    regressions = []
+    for case_id, stats in results.items():
+        before = baseline.get(case_id)
+        if before is None:
+            continue
+        change = stats["median"] / before["median"] - 1
+        marker = "❌" if change > tolerance else "  "
+        print(f"{marker} {case_id:<40}{before['median']:>10.2f} -> {stats['median']:>10.2f} µs  {change:+.0%}")
+        if change > tolerance:
+            regressions.append(case_id)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="pattern", default="*",
+                        help="only cases whose group.name matches this glob or substring")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--min-time", type=float, default=0.05, help="seconds per round (default 0.05)")
+    parser.add_argument("--page", type=int, default=50, help="get_messages page size (default 50)")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file from an earlier --save")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed median slowdown (default 0.10)")
+    args = parser.parse_args()
+
+    pattern = args.pattern if any(c in args.pattern for c in "*?[") else f"*{args.pattern}*"
+    cases = [case for case in build_cases(args.page) if fnmatch.fnmatch(case.id, pattern)]
+    if not cases:
+        raise SystemExit(f"no case matches {args.pattern!r}")
+
+    results = {case.id: run_case(case, args.rounds, args.min_time) for case in cases}
+    _report(results)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"page_size": args.page, "results": results}, f, indent=2)
+        print(f"saved {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = _compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} case(s) slower than the baseline by more than {args.tolerance:.0%}")
+            sys.exit(1)
+        print(f"✅ no case slower than the baseline by more than {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
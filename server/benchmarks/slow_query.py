@@ -0,0 +1,132 @@
+"""
+Check that one slow query doesn't hold up the rest of the process.
+
+Under eventlet, one greenlet runs `SELECT pg_sleep(--sleep)` through a
+connection pool while two others keep going: a client pinging an echo
+server over a local socket, standing in for unrelated socket traffic, and
+a loop of `SELECT 1` on another pooled connection. This runs once with
+plain psycopg2 and once with the wait callback from database/green.py; the
+green run fails (exit code 1) when a ping or a fast query was answered
+more than --budget-ms late while the slow query was running.
+
+Needs the database in DB_URL. tests/test_green.py checks the same property
+without one (python -m pytest tests).
+
+    python -m benchmarks.slow_query
+    python -m benchmarks.slow_query --sleep 5 --budget-ms 50
+"""
+import eventlet
+eventlet.monkey_patch()
+
+import argparse
+import sys
+import time
+from database import green
+from database.pool import ConnectionPool
+from Models.get_db_connection import get_db_connection
+
+
+def echo_server():
+    listener = eventlet.listen(("127.0.0.1", 0))
+
+    def serve(conn):
+        while True:
+            data = conn.recv(64)
+            if not data:
+                break
+            conn.sendall(data)
+        conn.close()
+
+    def accept():
+        while True:
+            conn, _ = listener.accept()
+            eventlet.spawn(serve, conn)
+
+    eventlet.spawn(accept)
+    return listener.getsockname()
+
+
+def _query(pool, sql, params=()):
+    with pool.connection() as conn:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        cur.fetchall()
+        cur.close()
+
+
+def run(pool, address, sleep, interval):
+    """
+    Run the slow query next to the ping and fast-query loops. Returns the
+    slow query's wall time and how late (ms) the worst ping / fast query
+    answered while it ran.
+    """
+    pings, queries = [], []
+    running = [True]
+    window = [float("inf"), float("inf")]      # slow query start / end
+
+    def timed(samples, fn):
+        # Measured from when the call was due, so time spent waiting for a
+        # blocked hub to wake the loop up counts as well
+        due = time.perf_counter()
+        while running[0]:
+            fn()
+            end = time.perf_counter()
+            # Only what overlapped the slow query counts
+            if end >= window[0] and due <= window[1]:
+                samples.append((end - due) * 1000)
+            eventlet.sleep(interval)
+            due = end + interval
+
+    sock = eventlet.connect(address)
+
+    def ping():
+        sock.sendall(b"ping")
+        sock.recv(64)
+
+    loops = [
+        eventlet.spawn(timed, pings, ping),
+        eventlet.spawn(timed, queries, lambda: _query(pool, "SELECT 1")),
+    ]
+    eventlet.sleep(0.5)                         # connections open, loops warm
+
+    window[0] = time.perf_counter()
+    eventlet.spawn(_query, pool, "SELECT pg_sleep(%s)", (sleep,)).wait()
+    window[1] = time.perf_counter()
+
+    running[0] = False
+    for loop in loops:
+        loop.wait()
+    sock.close()
+    return window[1] - window[0], max(pings, default=0.0), max(queries, default=0.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sleep", type=float, default=2.0, help="seconds the slow query takes")
+    parser.add_argument("--interval", type=float, default=0.01, help="seconds between pings and fast queries")
+    parser.add_argument("--budget-ms", type=float, default=100.0)
+    args = parser.parse_args()
+
+    address = echo_server()
+    results = {}
+    for mode in ("blocking", "green"):
+        if mode == "green":
+            green.install()
+        else:
+            green.uninstall()
+        pool = ConnectionPool(get_db_connection, max_size=2)
+        wall, ping, query = run(pool, address, args.sleep, args.interval)
+        pool.closeall()
+        results[mode] = (ping, query)
+        print(f"{mode:<9} slow query {wall:5.2f} s   worst ping {ping:8.1f} ms   worst SELECT 1 {query:8.1f} ms")
+    green.uninstall()
+
+    ping, query = results["green"]
+    if max(ping, query) > args.budget_ms:
+        print(f"❌ with green psycopg2 the hub still stalled for {max(ping, query):.1f} ms (budget {args.budget_ms} ms)")
+        sys.exit(1)
+    print(f"✅ with green psycopg2 nothing waited longer than {args.budget_ms} ms behind the slow query")
+
+
+if __name__ == "__main__":
+    main()
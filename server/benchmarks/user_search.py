@@ -0,0 +1,117 @@
+"""
+Benchmark for /users/search (services/user_search.py) on a synthetic user table.
+
+Loads --users users (default 100k) into a UserDirectory, then times prefix,
+multi-term and typo queries through UserDirectory.search, the call the
+endpoint makes (fuzzy fallback included, --limit defaults to the 50 the
+client asks for), and single-user upserts. Exits with code 1 when the p99
+of any query kind is over --budget-ms (default 1 ms).
+
+    python -m benchmarks.user_search
+    python -m benchmarks.user_search --users 250000 --queries 5000
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from services.shared_backend import MemoryBackend
+from services.user_directory import UserDirectory
+
+SYLLABLES = ["ma", "ri", "an", "jo", "el", "ka", "lu", "sa", "de", "no", "vi", "ra",
+             "to", "be", "li", "chr", "is", "ste", "ph", "en", "al", "ex", "ya", "zo"]
+
+
+def _name(rng, parts):
+    return "".join(rng.choice(SYLLABLES) for _ in range(parts)).title()
+
+
+def make_users(count, seed=1):
+    rng = random.Random(seed)
+    users = []
+    for uid in range(1, count + 1):
+        first = _name(rng, rng.randint(2, 3))
+        last = _name(rng, rng.randint(2, 4))
+        users.append({
+            "uid": uid,
+            "username": f"{first.lower()}{rng.randint(1, 9999)}",
+            "first_name": first,
+            "last_name": last,
+        })
+    return users
+
+
+def _timed(fn, inputs):
+    samples = []
+    for item in inputs:
+        start = time.perf_counter()
+        fn(item)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "p50": statistics.median(samples),
+        "p99": samples[int(len(samples) * 0.99) - 1],
+        "max": samples[-1],
+    }
+
+
+def _report(name, stats):
+    print(f"{name:<22} p50 {stats['p50']:.4f} ms   p99 {stats['p99']:.4f} ms   max {stats['max']:.4f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--budget-ms", type=float, default=1.0)
+    args = parser.parse_args()
+
+    rng = random.Random(2)
+    users = make_users(args.users)
+    directory = UserDirectory(MemoryBackend())
+    index = directory.index
+
+    start = time.perf_counter()
+    # What UserDirectory._reload does with the rows from user_table
+    index.build(users)
+    directory._install({u["uid"]: u for u in users}, 0)
+    print(f"build {args.users} users: {time.perf_counter() - start:.2f} s, {len(index.ordered)} distinct tokens")
+
+    names = [rng.choice(users)[rng.choice(("username", "first_name", "last_name"))].lower() for _ in range(args.queries)]
+    prefixes = [name[:rng.randint(1, min(len(name), 8))] for name in names]
+    multi = [
+        f"{u['first_name'][:rng.randint(1, 4)]} {u['last_name'][:rng.randint(1, 4)]}"
+        for u in (rng.choice(users) for _ in range(args.queries))
+    ]
+    typos = []
+    for name in names:
+        i = rng.randrange(len(name))
+        typos.append(name[:i] + rng.choice("aeiouxyz") + name[i + 1:])
+
+    def search(query):
+        return directory.search(query, None, args.limit)
+
+    results = {
+        "prefix": _timed(search, prefixes),
+        "prefix, 1-2 chars": _timed(search, [p[:2] for p in prefixes]),
+        "two terms": _timed(search, multi),
+        "typo (fuzzy)": _timed(search, typos),
+    }
+    for name, stats in results.items():
+        _report(name, stats)
+
+    new_users = make_users(1000, seed=3)
+    for offset, user in enumerate(new_users, start=args.users + 1):
+        user["uid"] = offset
+    _report("upsert (register)", _timed(index.upsert, new_users))
+
+    over = [name for name, stats in results.items() if stats["p99"] > args.budget_ms]
+    if over:
+        print(f"❌ p99 over the {args.budget_ms} ms budget: {', '.join(over)}")
+        sys.exit(1)
+    print(f"✅ every query kind's p99 within {args.budget_ms} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+# Puts server/ on sys.path, so tests import Config, database, services...
+# the way main.py does, whichever directory pytest is started from.
@@ -1,29 +1,29 @@
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from Models.get_db_connection import get_db_connection
+from database.pool import db_pool
+
+# Borrow a pooled connection: `with get_connection() as conn:`
+# Connections default to TimedCursor (Models/get_db_connection.py), so every
+# query made through them, helpers included, lands in connext_db_query_seconds.
+get_connection = db_pool.connection
 
 def fetch_all(query, params=()):
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute(query, params)
-    results = cur.fetchall()
-    cur.close()
-    conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(query, params)
+        results = cur.fetchall()
+        cur.close()
     return results
 
 def fetch_one(query, params=()):
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute(query, params)
-    result = cur.fetchone()
-    cur.close()
-    conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(query, params)
+        result = cur.fetchone()
+        cur.close()
     return result
 
 def execute(query, params=()):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(query, params)
-    conn.commit()
-    cur.close()
-    conn.close()
\ No newline at end of file
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(query, params)
+        conn.commit()
+        cur.close()
@@ -0,0 +1,122 @@
+"""
+EXPLAIN-based regression check for the hot message queries.
+
+Each query is planned with sequential scans disabled, so it only passes if
+an index can serve it. A plan that still contains a Seq Scan on one of our
+tables, or that skips the index we expect, fails the check.
+
+    python -m database.explain_check     # exit code 1 on regression
+"""
+import json
+import sys
+from database.db import get_connection
+
+CHECKED_TABLES = {"messages", "conversations", "user_table", "message_reactions"}
+
+# (name, sql, params, indexes the plan must use). These mirror the queries in
+# Routes/message_routes1.py, sockets/*.py and services/*.py; keep them in sync.
+HOT_QUERIES = [
+    (
+        "history page",
+        """
+        SELECT m.* FROM (
+            (SELECT * FROM messages
+             WHERE sender_id = %(me)s AND receiver_id = %(other)s AND message_id < %(cursor)s
+             ORDER BY message_id DESC LIMIT %(limit)s)
+            UNION ALL
+            (SELECT * FROM messages
+             WHERE sender_id = %(other)s AND receiver_id = %(me)s AND message_id < %(cursor)s
+               AND sender_id <> receiver_id
+             ORDER BY message_id DESC LIMIT %(limit)s)
+        ) m
+        ORDER BY m.message_id DESC LIMIT %(limit)s
+        """,
+        {"me": 1, "other": 2, "cursor": 2**31 - 1, "limit": 51},
+        {"messages_pair_history_idx"},
+    ),
+    (
+        "unseen filter",
+        """
+        UPDATE messages SET is_seen = TRUE
+        WHERE sender_id = %(other)s AND receiver_id = %(me)s AND is_seen = FALSE
+        """,
+        {"me": 1, "other": 2},
+        {"messages_unseen_idx", "messages_pair_history_idx"},
+    ),
+    (
+        "reply lookup",
+        "SELECT message_id, sender_id, content FROM messages WHERE message_id = %(id)s",
+        {"id": 1},
+        {"messages_pkey"},
+    ),
+    (
+        "page reactions",
+        """
+        SELECT message_id, reaction_type, array_agg(user_id::text ORDER BY created_at)
+        FROM message_reactions WHERE message_id = ANY(%(ids)s)
+        GROUP BY message_id, reaction_type
+        """,
+        {"ids": list(range(1, 51))},
+        {"message_reactions_pkey"},
+    ),
+    (
+        "inbox",
+        """
+        SELECT * FROM conversations WHERE user_low = %(me)s
+        UNION ALL
+        SELECT * FROM conversations WHERE user_high = %(me)s AND user_low <> %(me)s
+        """,
+        {"me": 1},
+        {"conversations_user_low_recent_idx", "conversations_user_high_recent_idx", "conversations_pkey"},
+    ),
+]
+
+
+def _walk(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _walk(child)
+
+
+def check_query(cur, sql, params, expected_indexes):
+    """Return a list of problems with the query's plan (empty when fine)."""
+    cur.execute("SAVEPOINT explain_check")
+    cur.execute("SET LOCAL enable_seqscan = off")
+    cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+    row = cur.fetchone()
+    cur.execute("ROLLBACK TO SAVEPOINT explain_check")
+
+    plan = list(row.values())[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    nodes = list(_walk(plan[0]["Plan"]))
+
+    problems = []
+    for node in nodes:
+        if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in CHECKED_TABLES:
+            problems.append(f"sequential scan on {node['Relation Name']}")
+
+    used = {node["Index Name"] for node in nodes if "Index Name" in node}
+    if expected_indexes and not used & expected_indexes:
+        problems.append(f"expected one of {sorted(expected_indexes)}, plan used {sorted(used) or 'no index'}")
+
+    return problems
+
+
+def run():
+    failures = 0
+    with get_connection() as conn:
+        cur = conn.cursor()
+        for name, sql, params, expected in HOT_QUERIES:
+            problems = check_query(cur, sql, params, expected)
+            if problems:
+                failures += 1
+                print(f"❌ {name}: {'; '.join(problems)}")
+            else:
+                print(f"✅ {name}")
+        cur.close()
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if run() else 0)
@@ -0,0 +1,58 @@
+"""
+Cooperative psycopg2 under eventlet.
+
+psycopg2 is C code that talks to the server through libpq's own socket,
+which eventlet.monkey_patch() never sees: a plain cur.execute() blocks the
+hub, and with it every connected client, until Postgres answers. With a
+wait callback installed, psycopg2 runs each query asynchronously and calls
+back whenever it would block; the callback parks the greenlet on the
+connection's socket (trampoline), so the hub keeps serving other greenlets
+while the query runs. This is what psycogreen does.
+
+The callback is process-wide and only makes sense once the process is
+monkey patched, so main.py installs it for DB_WAIT_MODE=green only when
+eventlet is in charge; CLI tools such as database.migrate stay blocking.
+"""
+from eventlet import patcher
+from eventlet.hubs import trampoline
+from psycopg2 import extensions, OperationalError
+from Utils.log import get_logger
+
+log = get_logger("db.green")
+
+
+def eventlet_wait_callback(conn, timeout=None):
+    while True:
+        # Query errors (unique violations and so on) come out of poll()
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            return
+        if state not in (extensions.POLL_READ, extensions.POLL_WRITE):
+            raise OperationalError(f"bad state from poll: {state}")
+        try:
+            trampoline(conn.fileno(), read=state == extensions.POLL_READ, write=state == extensions.POLL_WRITE)
+        except BaseException:
+            # The greenlet was killed or timed out mid-query: cancel it on the
+            # server as well, or the backend keeps working for nobody
+            try:
+                conn.cancel()
+            except Exception:
+                pass
+            raise
+
+
+def install():
+    """Make psycopg2 yield to the eventlet hub. Returns False if not monkey patched."""
+    if not patcher.is_monkey_patched("socket"):
+        return False
+    extensions.set_wait_callback(eventlet_wait_callback)
+    log.info("green_psycopg2_enabled")
+    return True
+
+
+def uninstall():
+    extensions.set_wait_callback(None)
+
+
+def is_installed():
+    return extensions.get_wait_callback() is eventlet_wait_callback
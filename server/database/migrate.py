@@ -0,0 +1,109 @@
+"""
+Versioned SQL migrations.
+
+Migrations live in database/migrations as NNNN_name.sql and are applied in
+order, each in its own transaction, and recorded in schema_migrations. An
+advisory lock keeps several workers starting at once from racing.
+
+    python -m database.migrate            # apply pending migrations
+    python -m database.migrate --status   # list applied / pending
+"""
+import os
+import re
+import sys
+from database.db import get_connection
+from Utils.log import get_logger
+
+log = get_logger("db.migrate")
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), "migrations")
+MIGRATION_FILE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+
+# Arbitrary constant shared by every worker: pg_advisory_lock key for migrations
+ADVISORY_LOCK_KEY = 72_616_301
+
+
+def discover():
+    """Return [(version, name, path)] for every migration file, oldest first."""
+    found = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            found.append((match.group(1), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    return found
+
+
+def _ensure_table(cur):
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version     TEXT PRIMARY KEY,
+            name        TEXT NOT NULL,
+            applied_at  TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+        """
+    )
+
+
+def applied_versions(cur):
+    _ensure_table(cur)
+    cur.execute("SELECT version FROM schema_migrations")
+    return {row["version"] for row in cur.fetchall()}
+
+
+def apply_migrations():
+    """Apply every pending migration. Returns the versions applied."""
+    applied = []
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_advisory_lock(%s)", (ADVISORY_LOCK_KEY,))
+        try:
+            done = applied_versions(cur)
+            conn.commit()
+
+            for version, name, path in discover():
+                if version in done:
+                    continue
+
+                with open(path, encoding="utf-8") as f:
+                    sql = f.read()
+
+                try:
+                    cur.execute(sql)
+                    cur.execute(
+                        "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                        (version, name),
+                    )
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    log.exception("migration_failed", version=version, name=name)
+                    raise
+
+                applied.append(version)
+                log.info("migration_applied", version=version, name=name)
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (ADVISORY_LOCK_KEY,))
+            conn.commit()
+            cur.close()
+
+    return applied
+
+
+def status():
+    with get_connection() as conn:
+        cur = conn.cursor()
+        done = applied_versions(cur)
+        conn.commit()
+        cur.close()
+    return [(version, name, version in done) for version, name, _ in discover()]
+
+
+if __name__ == "__main__":
+    if "--status" in sys.argv:
+        for version, name, is_applied in status():
+            print(f"{'applied' if is_applied else 'pending'}  {version}_{name}")
+    else:
+        versions = apply_migrations()
+        print(f"{len(versions)} migration(s) applied")
@@ -0,0 +1,28 @@
+-- Base tables. IF NOT EXISTS so databases created before migrations existed
+-- are adopted as-is.
+
+CREATE TABLE IF NOT EXISTS user_table (
+    uid                  SERIAL PRIMARY KEY,
+    username             TEXT NOT NULL UNIQUE,
+    password             TEXT NOT NULL,
+    date_created         TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    gender               TEXT,
+    first_name           TEXT,
+    last_name            TEXT,
+    bio                  TEXT,
+    email                TEXT,
+    profile_picture_url  TEXT
+);
+
+CREATE TABLE IF NOT EXISTS messages (
+    message_id           SERIAL PRIMARY KEY,
+    sender_id            INT NOT NULL REFERENCES user_table (uid),
+    receiver_id          INT NOT NULL REFERENCES user_table (uid),
+    content              TEXT NOT NULL,                -- Fernet ciphertext
+    reply_to_message_id  INT REFERENCES messages (message_id),
+    is_seen              BOOLEAN NOT NULL DEFAULT FALSE,
+    date_sent            TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    reactions            JSONB,
+    is_edited            BOOLEAN NOT NULL DEFAULT FALSE,
+    edited_at            TEXT
+);
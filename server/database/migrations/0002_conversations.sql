@@ -0,0 +1,52 @@
+-- One row per user pair holding the newest message and unread counts.
+-- Kept current by services/conversations.py inside the message transactions,
+-- so /latest-messages reads this table instead of windowing all of messages.
+
+CREATE TABLE IF NOT EXISTS conversations (
+    user_low          INT NOT NULL,                 -- smaller uid of the pair
+    user_high         INT NOT NULL,                 -- larger uid of the pair
+    last_message_id   INT NOT NULL,
+    last_sender_id    INT NOT NULL,
+    last_receiver_id  INT NOT NULL,
+    last_content      TEXT NOT NULL,                -- ciphertext, same as messages.content
+    last_is_seen      BOOLEAN NOT NULL DEFAULT FALSE,
+    last_date_sent    TIMESTAMPTZ NOT NULL,
+    unread_low        INT NOT NULL DEFAULT 0,       -- unseen messages addressed to user_low
+    unread_high       INT NOT NULL DEFAULT 0,       -- unseen messages addressed to user_high
+    PRIMARY KEY (user_low, user_high),
+    CHECK (user_low <= user_high)
+);
+
+CREATE INDEX IF NOT EXISTS conversations_user_low_recent_idx
+    ON conversations (user_low, last_date_sent DESC);
+CREATE INDEX IF NOT EXISTS conversations_user_high_recent_idx
+    ON conversations (user_high, last_date_sent DESC);
+
+-- Backfill from existing history
+INSERT INTO conversations (
+    user_low, user_high, last_message_id, last_sender_id, last_receiver_id,
+    last_content, last_is_seen, last_date_sent
+)
+SELECT DISTINCT ON (LEAST(sender_id, receiver_id), GREATEST(sender_id, receiver_id))
+    LEAST(sender_id, receiver_id),
+    GREATEST(sender_id, receiver_id),
+    message_id, sender_id, receiver_id, content, is_seen, date_sent
+FROM messages
+ORDER BY LEAST(sender_id, receiver_id), GREATEST(sender_id, receiver_id), message_id DESC
+ON CONFLICT (user_low, user_high) DO NOTHING;
+
+UPDATE conversations c
+SET unread_low = u.unread_low,
+    unread_high = u.unread_high
+FROM (
+    SELECT
+        LEAST(sender_id, receiver_id) AS user_low,
+        GREATEST(sender_id, receiver_id) AS user_high,
+        COUNT(*) FILTER (WHERE receiver_id = LEAST(sender_id, receiver_id)) AS unread_low,
+        COUNT(*) FILTER (WHERE receiver_id = GREATEST(sender_id, receiver_id)
+                           AND sender_id <> receiver_id) AS unread_high
+    FROM messages
+    WHERE is_seen = FALSE
+    GROUP BY 1, 2
+) u
+WHERE c.user_low = u.user_low AND c.user_high = u.user_high;
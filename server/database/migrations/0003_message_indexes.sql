@@ -0,0 +1,17 @@
+-- Indexes for the hot message queries. Checked by database/explain_check.py.
+-- Plain CREATE INDEX (not CONCURRENTLY) because each migration runs in a
+-- transaction; it holds a write lock on messages while it builds.
+
+-- Two-party history: one backward range scan per direction, keyed on the
+-- message_id pagination cursor (GET /messages/<id>).
+CREATE INDEX IF NOT EXISTS messages_pair_history_idx
+    ON messages (sender_id, receiver_id, message_id);
+
+-- Unseen filter: sender_id = %s AND receiver_id = %s AND is_seen = FALSE.
+-- Partial, so it only holds the (small) unread backlog.
+CREATE INDEX IF NOT EXISTS messages_unseen_idx
+    ON messages (sender_id, receiver_id)
+    WHERE is_seen = FALSE;
+
+-- The reply lookup and self-join go through messages_pkey; the inbox reads
+-- conversations through the indexes created in 0002.
@@ -0,0 +1,22 @@
+-- Read receipts as a watermark per side of the conversation: everything the
+-- other user sent up to this message_id has been seen.
+
+ALTER TABLE conversations
+    ADD COLUMN IF NOT EXISTS seen_up_to_low  INT NOT NULL DEFAULT 0,   -- read by user_low
+    ADD COLUMN IF NOT EXISTS seen_up_to_high INT NOT NULL DEFAULT 0;   -- read by user_high
+
+-- Backfill from existing history
+UPDATE conversations c
+SET seen_up_to_low = COALESCE(s.seen_up_to_low, 0),
+    seen_up_to_high = COALESCE(s.seen_up_to_high, 0)
+FROM (
+    SELECT
+        LEAST(sender_id, receiver_id) AS user_low,
+        GREATEST(sender_id, receiver_id) AS user_high,
+        MAX(message_id) FILTER (WHERE receiver_id = LEAST(sender_id, receiver_id)) AS seen_up_to_low,
+        MAX(message_id) FILTER (WHERE receiver_id = GREATEST(sender_id, receiver_id)) AS seen_up_to_high
+    FROM messages
+    WHERE is_seen = TRUE
+    GROUP BY 1, 2
+) s
+WHERE c.user_low = s.user_low AND c.user_high = s.user_high;
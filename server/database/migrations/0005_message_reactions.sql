@@ -0,0 +1,36 @@
+-- Reactions as rows instead of a JSON blob rewritten on every click.
+-- One reaction per user per message; messages.reactions is no longer written.
+
+CREATE TABLE IF NOT EXISTS message_reactions (
+    message_id     INT NOT NULL REFERENCES messages (message_id) ON DELETE CASCADE,
+    user_id        INT NOT NULL REFERENCES user_table (uid),
+    reaction_type  TEXT NOT NULL,
+    created_at     TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (message_id, user_id)
+);
+
+-- Per-message totals kept by services/reactions.py in the same transaction
+CREATE TABLE IF NOT EXISTS message_reaction_counts (
+    message_id     INT NOT NULL REFERENCES messages (message_id) ON DELETE CASCADE,
+    reaction_type  TEXT NOT NULL,
+    count          INT NOT NULL,
+    PRIMARY KEY (message_id, reaction_type)
+);
+
+-- Backfill from the JSON column: {"love": ["12", "34"], ...}
+INSERT INTO message_reactions (message_id, user_id, reaction_type)
+SELECT m.message_id, u.user_id::int, r.key
+FROM messages m
+CROSS JOIN LATERAL jsonb_each(m.reactions) AS r(key, users)
+CROSS JOIN LATERAL jsonb_array_elements_text(
+    CASE WHEN jsonb_typeof(r.users) = 'array' THEN r.users ELSE '[]' END
+) AS u(user_id)
+WHERE jsonb_typeof(m.reactions) = 'object'
+  AND EXISTS (SELECT 1 FROM user_table WHERE uid = u.user_id::int)
+ON CONFLICT (message_id, user_id) DO NOTHING;
+
+INSERT INTO message_reaction_counts (message_id, reaction_type, count)
+SELECT message_id, reaction_type, COUNT(*)
+FROM message_reactions
+GROUP BY message_id, reaction_type
+ON CONFLICT (message_id, reaction_type) DO NOTHING;
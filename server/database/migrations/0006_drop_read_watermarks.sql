@@ -0,0 +1,6 @@
+-- The watermark columns from 0004 were written but never read: seen state
+-- lives in messages.is_seen, and the messages_seen event carries seen_up_to.
+
+ALTER TABLE conversations
+    DROP COLUMN IF EXISTS seen_up_to_low,
+    DROP COLUMN IF EXISTS seen_up_to_high;
@@ -0,0 +1,5 @@
+-- Reaction counts are derived from message_reactions (services/reactions.py):
+-- with at most two reacting users per message, the running totals from 0005
+-- only had to be kept in step, and drifted when they weren't.
+
+DROP TABLE IF EXISTS message_reaction_counts;
@@ -0,0 +1,232 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from psycopg2 import extensions, InterfaceError, OperationalError
+from Config.Config import Config
+from Models.get_db_connection import get_db_connection
+from services.metrics import registry
+
+wait_seconds = registry.histogram(
+    "connext_db_pool_wait_seconds", "Time spent waiting for a pooled connection"
+)
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection frees up within the pool timeout."""
+
+
+class _PooledConnection:
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    """
+    Bounded pool of psycopg2 connections.
+
+    Only threading primitives are used, so once eventlet.monkey_patch() has
+    run a caller waiting for a free connection parks its greenlet instead of
+    blocking the hub.
+    """
+
+    def __init__(self, connect, max_size=10, max_age=1800, max_idle=30, timeout=10):
+        self._connect = connect
+        self.max_size = max_size
+        self.max_age = max_age      # recycle connections older than this (seconds)
+        self.max_idle = max_idle    # ping connections idle longer than this (seconds)
+        self.timeout = timeout      # how long acquire() waits for a free slot
+
+        self._idle = deque()
+        self._size = 0              # open connections, idle + checked out
+        self._waiting = 0
+        self._cond = threading.Condition(threading.Lock())
+
+        self._created = 0
+        self._closed = 0
+        self._recycled = 0
+        self._discarded = 0
+        self._checkouts = 0
+        self._timeouts = 0
+
+    # ---------------- checkout / checkin ----------------
+    def acquire(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        entry = None
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    # LIFO: hand out the most recently used (warmest) connection
+                    entry = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"no database connection available after {self.timeout}s")
+
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            self._checkouts += 1
+        wait_seconds.observe(time.monotonic() - started)
+
+        # Validation and connecting happen outside the lock; the slot is already ours.
+        if entry is not None and not self._is_usable(entry):
+            self._close(entry.conn)
+            entry = None
+
+        if entry is None:
+            try:
+                entry = _PooledConnection(self._connect())
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._created += 1
+
+        return entry
+
+    def release(self, entry, discard=False):
+        conn = entry.conn
+
+        if not discard and not conn.closed:
+            status = conn.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                # Never hand out a connection with a half-finished transaction.
+                try:
+                    conn.rollback()
+                except Exception:
+                    discard = True
+
+        if not discard and time.monotonic() - entry.created_at > self.max_age:
+            discard = True
+            with self._cond:
+                self._recycled += 1
+
+        if discard or conn.closed:
+            self._close(conn)
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            return
+
+        entry.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection for the duration of a with-block.
+        Uncommitted work is rolled back when the block exits.
+        """
+        entry = self.acquire()
+        discard = False
+        try:
+            yield entry.conn
+        except (OperationalError, InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.release(entry, discard=discard)
+
+    # ---------------- health ----------------
+    def _is_usable(self, entry):
+        conn = entry.conn
+        now = time.monotonic()
+
+        if conn.closed:
+            self._count_discard()
+            return False
+
+        if now - entry.created_at > self.max_age:
+            with self._cond:
+                self._recycled += 1
+            return False
+
+        if now - entry.last_used > self.max_idle:
+            try:
+                cur = conn.cursor()
+                cur.execute("SELECT 1")
+                cur.close()
+                conn.rollback()
+            except Exception:
+                self._count_discard()
+                return False
+
+        return True
+
+    def _count_discard(self):
+        with self._cond:
+            self._discarded += 1
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._closed += 1
+
+    def closeall(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for entry in idle:
+            self._close(entry.conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "waiting": self._waiting,
+                "created": self._created,
+                "closed": self._closed,
+                "recycled": self._recycled,
+                "discarded": self._discarded,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+            }
+
+
+db_pool = ConnectionPool(
+    get_db_connection,
+    max_size=Config.DB_POOL_MAX_SIZE,
+    max_age=Config.DB_POOL_MAX_AGE,
+    max_idle=Config.DB_POOL_MAX_IDLE,
+    timeout=Config.DB_POOL_TIMEOUT,
+)
+
+registry.gauge(
+    "connext_db_pool_connections", "Pooled connections by state", ["state"],
+    fn=lambda: {(k,): v for k, v in db_pool.stats().items() if k in ("size", "idle", "in_use", "waiting")},
+)
+registry.counter(
+    "connext_db_pool_events_total", "Connections created, closed, recycled, discarded, checked out; checkout timeouts", ["event"],
+    fn=lambda: {(k,): v for k, v in db_pool.stats().items() if k in ("created", "closed", "recycled", "discarded", "checkouts", "timeouts")},
+)
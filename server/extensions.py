@@ -1,13 +1,43 @@
 from flask_socketio import SocketIO
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, MultiFernet
 from Config.Config import Config
+from Utils import json_codec
+from services.metrics import registry
+
+emits = registry.counter("connext_socketio_emits_total", "Socket.IO emits by event", ["event"])
+recipients = registry.counter(
+    "connext_socketio_emit_recipients_total", "Sockets on this worker an emit was addressed to", ["event"]
+)
+
+
+class InstrumentedSocketIO(SocketIO):
+    """SocketIO that counts every emit and its fan-out (flask_socketio.emit goes through here too)."""
+
+    def emit(self, event, *args, **kwargs):
+        emits.labels(event).inc()
+        to = kwargs.get("to") or kwargs.get("room")
+        namespace = kwargs.get("namespace") or "/"
+        try:
+            rooms = self.server.manager.rooms.get(namespace, {})
+            if isinstance(to, (list, tuple)):
+                # Several rooms: each socket is sent the packet once
+                fanout = len(set().union(*(rooms.get(room, ()) for room in to)))
+            else:
+                fanout = len(rooms.get(to, ()))
+        except Exception:
+            fanout = 0
+        recipients.labels(event).inc(fanout)
+        return super().emit(event, *args, **kwargs)
+
 
 # Initialize extensions
-fernet = Fernet(Config.MESSAGE_SECRET_KEY)
-socketio = SocketIO(cors_allowed_origins="*",
-                async_mode='eventlet')  
+fernet = MultiFernet([Fernet(key) for key in Config.MESSAGE_KEYS])
+socketio = InstrumentedSocketIO(cors_allowed_origins="*",
+                async_mode='eventlet',
+                message_queue=Config.SOCKETIO_MESSAGE_QUEUE,
+                json=json_codec)  
 bcrypt = Bcrypt()
 jwt = JWTManager()
 
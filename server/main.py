@@ -22,14 +22,24 @@ bcrypt.init_app(app)
 socketio.init_app(app)
 #talisman.init_app(app)
 
+# ---------------- DATABASE ----------------
+if Config.DB_WAIT_MODE == "green":
+    from database import green
+    green.install()
+if Config.DB_AUTO_MIGRATE:
+    from database.migrate import apply_migrations
+    apply_migrations()
+
 
 
 # ---------------- BLUEPRINTS ----------------
 from Routes.auth import auth_bp
 from Routes.message_routes1 import message_bp
+from Routes.metrics import metrics_bp
 
 app.register_blueprint(auth_bp)
 app.register_blueprint(message_bp)
+app.register_blueprint(metrics_bp)
 
 
 
@@ -41,6 +51,19 @@ import sockets.reactions
 import sockets.seen
 import sockets.typing
 
+# ---------------- BACKGROUND TASKS ----------------
+from services.online_users import online_manager
+from services.presence_broadcast import presence_broadcaster
+online_manager.start(socketio, on_offline=lambda uid: presence_broadcaster.mark(uid, False))
+presence_broadcaster.start(socketio, app)
+from services.token_refresh import refresh_scheduler
+refresh_scheduler.start(socketio, app)
+from services.typing_relay import typing_relay
+typing_relay.start(socketio)
+if Config.MESSAGE_PIPELINE:
+    from services.message_pipeline import message_pipeline
+    message_pipeline.start(socketio)
+
 #sockets
 """ app.register_blueprint(connection_bp)
 app.register_blueprint(messaging_bp)
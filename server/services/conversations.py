@@ -0,0 +1,95 @@
+"""
+Upkeep of the `conversations` summary table (see database/migrations/0002_conversations.sql).
+
+Every function takes the caller's cursor and does not commit, so the summary
+changes in the same transaction as the messages it describes.
+"""
+from psycopg2.extras import execute_values
+
+
+# Commits can land out of id order, so only a newer message may replace the
+# "last message" columns; the unread counters always move.
+_LAST_COLUMNS = ("last_sender_id", "last_receiver_id", "last_content", "last_is_seen", "last_date_sent")
+_UPDATE_LAST = ",\n".join(
+    f"{col} = CASE WHEN EXCLUDED.last_message_id > conversations.last_message_id "
+    f"THEN EXCLUDED.{col} ELSE conversations.{col} END"
+    for col in _LAST_COLUMNS
+)
+
+
+def _pair(user1, user2):
+    user1, user2 = int(user1), int(user2)
+    return min(user1, user2), max(user1, user2)
+
+
+def record_message(cur, message):
+    """New message: it becomes the conversation's last message and counts as unread for the receiver."""
+    record_messages(cur, [message])
+
+
+def record_messages(cur, messages):
+    """Batch form of record_message: one upsert row per conversation, however many messages."""
+    rows = {}
+    for message in sorted(messages, key=lambda m: m["message_id"]):
+        low, high = _pair(message["sender_id"], message["receiver_id"])
+        receiver = int(message["receiver_id"])
+        previous = rows.get((low, high))
+        unread_low = (previous[8] if previous else 0) + (1 if receiver == low else 0)
+        unread_high = (previous[9] if previous else 0) + (1 if receiver == high and low != high else 0)
+        rows[(low, high)] = (
+            low, high, message["message_id"], message["sender_id"], message["receiver_id"],
+            message["content"], message["is_seen"], message["date_sent"], unread_low, unread_high,
+        )
+
+    if not rows:
+        return
+
+    execute_values(
+        cur,
+        f"""
+        INSERT INTO conversations (
+            user_low, user_high, last_message_id, last_sender_id, last_receiver_id,
+            last_content, last_is_seen, last_date_sent, unread_low, unread_high
+        )
+        VALUES %s
+        ON CONFLICT (user_low, user_high) DO UPDATE SET
+            {_UPDATE_LAST},
+            last_message_id = GREATEST(conversations.last_message_id, EXCLUDED.last_message_id),
+            unread_low = conversations.unread_low + EXCLUDED.unread_low,
+            unread_high = conversations.unread_high + EXCLUDED.unread_high
+        """,
+        list(rows.values()),
+    )
+
+
+def record_edit(cur, message_id, sender_id, receiver_id, content):
+    """Edited message: refresh the preview if it is the conversation's last message."""
+    low, high = _pair(sender_id, receiver_id)
+    cur.execute(
+        """
+        UPDATE conversations
+        SET last_content = %s
+        WHERE user_low = %s AND user_high = %s AND last_message_id = %s
+        """,
+        (content, low, high, int(message_id)),
+    )
+
+
+def record_seen(cur, viewer_id, other_id, seen_count, seen_up_to):
+    """`viewer_id` saw `seen_count` more messages from `other_id`, up to message `seen_up_to`."""
+    if not seen_count:
+        return
+
+    viewer = int(viewer_id)
+    low, high = _pair(viewer_id, other_id)
+    side = "low" if viewer == low else "high"
+
+    cur.execute(
+        f"""
+        UPDATE conversations
+        SET unread_{side} = GREATEST(unread_{side} - %(count)s, 0),
+            last_is_seen = last_is_seen OR (last_receiver_id = %(viewer)s AND last_message_id <= %(up_to)s)
+        WHERE user_low = %(low)s AND user_high = %(high)s
+        """,
+        {"count": int(seen_count), "up_to": int(seen_up_to), "viewer": viewer, "low": low, "high": high},
+    )
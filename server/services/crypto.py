@@ -0,0 +1,53 @@
+from extensions import fernet
+from services.message_cache import message_cache
+from services.metrics import registry
+
+crypto_seconds = registry.histogram(
+    "connext_crypto_seconds", "Fernet time per call", ["op"],
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.1, 0.5),
+)
+_encrypt_seconds = crypto_seconds.labels("encrypt")
+_decrypt_seconds = crypto_seconds.labels("decrypt")
+
+
+class MessageCrypto:
+    """
+    The one place message content is encrypted and decrypted.
+
+    `fernet` is the MultiFernet from extensions.py: new content is encrypted
+    with the primary key and content written under a retired key still
+    decrypts.
+    """
+
+    def __init__(self, fernet, cache):
+        self.fernet = fernet
+        self.cache = cache
+
+    # ---------------- single message ----------------
+    def encrypt(self, message: str) -> str:
+        with _encrypt_seconds.time():
+            return self.fernet.encrypt(message.encode()).decode()
+
+    def decrypt(self, token: str) -> str:
+        with _decrypt_seconds.time():
+            return self.fernet.decrypt(token).decode()
+
+    def decrypt_message(self, message_id, token: str) -> str:
+        """Decrypt through the message cache."""
+        return self.cache.get_or_decrypt(message_id, token, self.decrypt)
+
+    # ---------------- pages ----------------
+    def decrypt_rows(self, rows, field="content", id_field="message_id"):
+        """
+        Decrypt `field` in place on every row that has one, through the
+        message cache.
+        """
+        get_or_decrypt, decrypt = self.cache.get_or_decrypt, self.decrypt
+        for row in rows:
+            token = row.get(field)
+            if token:
+                row[field] = get_or_decrypt(row[id_field], token, decrypt)
+        return rows
+
+
+message_crypto = MessageCrypto(fernet, message_cache)
@@ -0,0 +1,55 @@
+"""
+Hydration stage for message lists (history pages).
+
+The page query returns bare message rows. hydrate_messages() then fills in
+plaintext, reply previews and reactions with a fixed number of batched
+queries, however many messages, replies and reactions the page holds:
+
+    reply targets   one `message_id = ANY(%s)` query, only for targets not on the page
+    reactions       one `message_id = ANY(%s)` query (services/reactions.py)
+
+Every message is decrypted at most once, even if several rows quote it.
+"""
+from services import reactions
+from services.crypto import message_crypto
+
+
+def _attach_replies(cur, messages, crypto):
+    by_id = {m["message_id"]: m for m in messages}
+    wanted = {m["reply_to_message_id"] for m in messages if m.get("reply_to_message_id")}
+
+    # Quoted messages that are on the page are already decrypted
+    targets = {mid: by_id[mid] for mid in wanted if mid in by_id}
+    missing = wanted - targets.keys()
+    if missing:
+        cur.execute(
+            "SELECT message_id, sender_id, content FROM messages WHERE message_id = ANY(%s)",
+            (list(missing),),
+        )
+        fetched = crypto.decrypt_rows(cur.fetchall())
+        targets.update((row["message_id"], row) for row in fetched)
+
+    for m in messages:
+        target = targets.get(m.get("reply_to_message_id"))
+        m["reply_message_id"] = target["message_id"] if target else None
+        m["reply_content"] = target["content"] if target else None
+        m["reply_sender_id"] = target["sender_id"] if target else None
+
+
+def _attach_reactions(cur, messages):
+    found = reactions.load(cur, [m["message_id"] for m in messages])
+    for m in messages:
+        current = found.get(m["message_id"])
+        m["reactions"] = current or None
+        m["reaction_counts"] = reactions.counts(current)
+
+
+def hydrate_messages(cur, messages, crypto=message_crypto):
+    """Decrypt `messages` in place and attach replies and reactions. Returns the list."""
+    if not messages:
+        return messages
+
+    crypto.decrypt_rows(messages)
+    _attach_replies(cur, messages, crypto)
+    _attach_reactions(cur, messages)
+    return messages
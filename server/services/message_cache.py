@@ -0,0 +1,86 @@
+import threading
+from collections import OrderedDict
+from Config.Config import Config
+from services.metrics import registry
+
+
+class MessageCache:
+    """
+    Bounded LRU of decrypted message content.
+
+    Entries are keyed by message_id and carry a version taken from the tail
+    of the Fernet token. Tokens end in their HMAC, so every encryption gets a
+    new version and an edited message can never be served as its old text,
+    even by a worker that missed the invalidation.
+    """
+
+    VERSION_CHARS = 16
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self.entries = OrderedDict()   # message_id -> (version, plaintext)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def version_of(cls, token):
+        return token[-cls.VERSION_CHARS:]
+
+    def get(self, message_id, token):
+        version = self.version_of(token)
+        with self.lock:
+            entry = self.entries.get(message_id)
+            if entry is not None and entry[0] == version:
+                self.entries.move_to_end(message_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, message_id, token, plaintext):
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            self.entries[message_id] = (self.version_of(token), plaintext)
+            self.entries.move_to_end(message_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, message_id):
+        with self.lock:
+            self.entries.pop(message_id, None)
+
+    def get_or_decrypt(self, message_id, token, decrypt):
+        """Return the cached plaintext, or decrypt the token and cache it."""
+        plaintext = self.get(message_id, token)
+        if plaintext is None:
+            plaintext = decrypt(token)
+            self.put(message_id, token, plaintext)
+        return plaintext
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+message_cache = MessageCache(max_size=Config.MESSAGE_CACHE_SIZE)
+registry.gauge("connext_message_cache_entries", "Decrypted messages cached", fn=lambda: len(message_cache.entries))
+registry.counter(
+    "connext_message_cache_lookups_total", "Message cache lookups", ["result"],
+    fn=lambda: {("hit",): message_cache.hits, ("miss",): message_cache.misses},
+)
@@ -0,0 +1,57 @@
+"""
+Timestamps and payloads of the message events.
+
+The socket handlers call these between their database work and their
+emits, and benchmarks/message_cost.py calls the very same functions, so
+its handler cases time the handlers' own CPU path rather than a copy.
+"""
+from datetime import datetime
+import pytz
+from services.crypto import message_crypto
+
+TIMEZONE = pytz.timezone("Asia/Manila")
+
+
+def sent_at():
+    """date_sent of a new message."""
+    return datetime.now(TIMEZONE).isoformat()
+
+
+def edited_at():
+    """edited_at of an edit, in the format the client shows as is."""
+    return datetime.now().astimezone(TIMEZONE).strftime("%H:%M %p %S")
+
+
+def new_message(saved, content, date_sent, reply_row=None, pending=False, crypto=message_crypto):
+    """new_message payload for a saved (or pipelined) row; `reply_row` is the quoted message, encrypted."""
+    reply = None
+    if reply_row:
+        reply = {
+            "message_id": reply_row["message_id"],
+            "sender_id": reply_row["sender_id"],
+            "content": crypto.decrypt_message(reply_row["message_id"], reply_row["content"]),
+        }
+
+    return {
+        "message_id": saved["message_id"],
+        "sender_id": saved["sender_id"],
+        "receiver_id": saved["receiver_id"],
+        "content": content,
+        "is_seen": saved["is_seen"],
+        "date_sent": date_sent,
+        "reply_to_message_id": saved.get("reply_to_message_id"),
+        "reply": reply,
+        "pending": pending,     # True until message_ack
+    }
+
+
+def message_edited(updated, content, edited_at):
+    """message_edited payload for the row the UPDATE returned."""
+    return {
+        "message_id": updated["message_id"],
+        "sender_id": updated["sender_id"],
+        "receiver_id": updated["receiver_id"],
+        "content": content,
+        "is_edited": updated["is_edited"],
+        "edited_at": edited_at,
+    }
@@ -0,0 +1,219 @@
+"""
+Write-behind persistence for send_message (Config.MESSAGE_PIPELINE).
+
+In pipeline mode the socket handler does not wait for the database:
+
+    1. the message gets its real message_id from a block reserved on the
+       messages sequence (one round trip per MESSAGE_ID_BLOCK messages),
+    2. it is emitted to the room straight away,
+    3. a single writer task drains the queue in FIFO order and stores each
+       batch with one multi-row INSERT plus one conversations upsert, in
+       one transaction,
+    4. the sender gets `message_ack` once its message is committed, or
+       `message_failed` when the batch still fails after MAX_RETRIES.
+
+Messages are written in the order they were accepted. When a batch fails
+its rows are written one by one. A row that fails on its own (say, to an
+unknown receiver) is dropped with `message_failed` straight away, so it
+can't hold up the messages behind it. When the database itself is the
+problem (connection errors), that row and everything after it go back to
+the front of the queue and are retried, up to MAX_RETRIES times. Until its
+batch commits (normally within MESSAGE_PIPELINE_INTERVAL) a message is not
+visible to queries: an edit or reaction that arrives earlier gets "not
+found".
+
+message_id is the order of messages everywhere: history's keyset cursor
+and the "newer id wins" upsert in conversations.record_messages rely on
+it. A block of ids reserved by one process only follows send order within
+that process, so with several workers (SOCKETIO_MESSAGE_QUEUE set) the
+block size is forced to 1: every message takes nextval() when it is
+accepted, and ids follow acceptance order across all workers. They do not
+follow commit order: each worker's writer commits its own batches, so a
+lower id can become visible after a higher one. History read with a
+`before` cursor is unaffected, but a client catching up with `after` has
+to re-read a small overlap behind its cursor (see get_messages).
+"""
+import threading
+from collections import deque
+from psycopg2 import InterfaceError, OperationalError
+from psycopg2.extras import execute_values
+from Config.Config import Config
+from database.db import get_connection
+from services import conversations
+from services.metrics import registry
+from Utils.log import get_logger
+
+log = get_logger("pipeline")
+
+_COLUMNS = ("message_id", "sender_id", "receiver_id", "content", "reply_to_message_id", "is_seen", "date_sent")
+
+
+class MessageIdAllocator:
+    """Hands out message_ids from blocks reserved on the messages sequence."""
+
+    def __init__(self, block_size=100):
+        self.block_size = block_size
+        self.ids = deque()
+        self.lock = threading.Lock()
+
+    def next_id(self):
+        with self.lock:
+            if not self.ids:
+                with get_connection() as conn:
+                    cur = conn.cursor()
+                    cur.execute(
+                        """
+                        SELECT nextval(pg_get_serial_sequence('messages', 'message_id')) AS id
+                        FROM generate_series(1, %s)
+                        """,
+                        (self.block_size,),
+                    )
+                    self.ids.extend(sorted(row["id"] for row in cur.fetchall()))
+                    conn.commit()
+                    cur.close()
+            return self.ids.popleft()
+
+
+class MessagePipeline:
+    def __init__(self, batch_size=500, interval=0.05, max_retries=5, id_block=100):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_retries = max_retries
+        self.allocator = MessageIdAllocator(id_block)
+        self.queue = deque()        # (row, sid, attempts)
+        self.pending = {}           # message_id -> row, until committed
+        self.lock = threading.Lock()
+        self.written = 0
+        self.failed = 0
+
+    def submit(self, sid, sender_id, receiver_id, content, reply_to, date_sent):
+        """Queue an (encrypted) message for writing. Returns the row as it will be stored."""
+        row = {
+            "message_id": self.allocator.next_id(),
+            "sender_id": int(sender_id),
+            "receiver_id": int(receiver_id),
+            "content": content,
+            "reply_to_message_id": reply_to,
+            "is_seen": False,
+            "date_sent": date_sent,
+        }
+        with self.lock:
+            self.pending[row["message_id"]] = row
+            self.queue.append((row, sid, 0))
+        return row
+
+    def get_pending(self, message_id):
+        """A queued message that is not committed yet (e.g. the target of a quick reply)."""
+        with self.lock:
+            return self.pending.get(message_id)
+
+    def backlog(self):
+        with self.lock:
+            return len(self.queue)
+
+    def _take_batch(self):
+        with self.lock:
+            batch = []
+            while self.queue and len(batch) < self.batch_size:
+                batch.append(self.queue.popleft())
+            return batch
+
+    def _write(self, batch):
+        rows = [row for row, _, _ in batch]
+        with get_connection() as conn:
+            cur = conn.cursor()
+            execute_values(
+                cur,
+                f"INSERT INTO messages ({', '.join(_COLUMNS)}) VALUES %s",
+                [tuple(row[c] for c in _COLUMNS) for row in rows],
+                page_size=len(rows),
+            )
+            conversations.record_messages(cur, rows)
+            conn.commit()
+            cur.close()
+
+    def _done(self, socketio, batch):
+        with self.lock:
+            for row, _, _ in batch:
+                self.pending.pop(row["message_id"], None)
+        for row, sid, _ in batch:
+            socketio.emit("message_ack", {"message_id": row["message_id"]}, room=sid)
+        self.written += len(batch)
+
+    def _dead_letter(self, socketio, row, sid, error):
+        """Give up on `row`: it is never written and its sender is told so."""
+        with self.lock:
+            self.pending.pop(row["message_id"], None)
+        self.failed += 1
+        log.warning("pipeline_message_dropped", message_id=row["message_id"], sender=row["sender_id"], error=str(error))
+        socketio.emit("message_failed", {"message_id": row["message_id"], "error": str(error)}, room=sid)
+
+    def _retry(self, socketio, failed, error):
+        """Put `failed` back at the front of the queue; its first row used up an attempt."""
+        (row, sid, attempts), rest = failed[0], failed[1:]
+        attempts += 1
+        log.warning("pipeline_retry", message_id=row["message_id"], attempt=attempts, error=str(error))
+        with self.lock:
+            # Same order as before, so later messages can't overtake them
+            self.queue.extendleft(reversed(rest))
+            if attempts < self.max_retries:
+                self.queue.appendleft((row, sid, attempts))
+        if attempts >= self.max_retries:
+            self._dead_letter(socketio, row, sid, error)
+
+    def flush(self, socketio):
+        """Write one batch. Returns how many messages left the queue (0: database trouble)."""
+        batch = self._take_batch()
+        if not batch:
+            return 0
+
+        try:
+            self._write(batch)
+            self._done(socketio, batch)
+            return len(batch)
+        except Exception as e:
+            log.error("pipeline_batch_failed", batch=len(batch), error=str(e))
+
+        # Write the rows one at a time, in order, to find out what failed
+        for i, (row, sid, attempts) in enumerate(batch):
+            try:
+                self._write([(row, sid, attempts)])
+            except (OperationalError, InterfaceError) as e:
+                # The database, not the row: retry from here, keeping the order
+                self._retry(socketio, batch[i:], e)
+                return i
+            except Exception as e:
+                # The row itself is bad (say, an unknown receiver); retrying
+                # would only hold up everything queued behind it
+                self._dead_letter(socketio, row, sid, e)
+                continue
+            self._done(socketio, [(row, sid, attempts)])
+        return len(batch)
+
+    def run(self, socketio):
+        backoff = self.interval
+        while True:
+            socketio.sleep(backoff)
+            while self.backlog():
+                if not self.flush(socketio):
+                    # Database trouble: wait longer before the retry
+                    backoff = min(backoff * 2, 5)
+                    break
+                backoff = self.interval
+
+    def start(self, socketio):
+        socketio.start_background_task(self.run, socketio)
+
+
+message_pipeline = MessagePipeline(
+    batch_size=Config.MESSAGE_PIPELINE_BATCH_SIZE,
+    interval=Config.MESSAGE_PIPELINE_INTERVAL,
+    max_retries=Config.MESSAGE_PIPELINE_MAX_RETRIES,
+    # Per-process id blocks would interleave out of send order across workers
+    id_block=1 if Config.SOCKETIO_MESSAGE_QUEUE else Config.MESSAGE_ID_BLOCK,
+)
+registry.gauge("connext_pipeline_backlog", "Messages queued for the write-behind pipeline", fn=message_pipeline.backlog)
+registry.counter(
+    "connext_pipeline_messages_total", "Messages written or dropped by the pipeline", ["result"],
+    fn=lambda: {("written",): message_pipeline.written, ("failed",): message_pipeline.failed},
+)
@@ -0,0 +1,197 @@
+"""
+Process-local metrics, rendered in the Prometheus text format on /metrics.
+
+    sends = registry.counter("connext_messages_sent_total", "Messages accepted", ["mode"])
+    sends.labels("direct").inc()
+
+    latency = registry.histogram("connext_socket_event_seconds", "Handler time", ["event"])
+    with latency.time("send_message"):
+        ...
+
+    registry.gauge("connext_online_users", "Users online", fn=online_manager.count)
+
+Counters and gauges can take `fn` instead; it is read at scrape time, so
+code that already keeps a stats() dict doesn't have to push anything. Each
+worker process reports its own numbers; Prometheus sums them per instance.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, label_names=(), fn=None):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.fn = fn
+        self.children = {}          # label values -> child
+        self.lock = threading.Lock()
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        child = self.children.get(key)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self):
+        """(suffix, label values, extra label pairs, value) tuples."""
+        if self.fn is None:
+            return [("", key, (), child.value) for key, child in list(self.children.items())]
+        # `fn` returns a number, or {label values tuple: number}
+        try:
+            current = self.fn()
+        except Exception:
+            return []
+        if isinstance(current, dict):
+            return [("", key if isinstance(key, tuple) else (key,), (), value) for key, value in current.items()]
+        return [("", (), (), current)]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_label_text(self.label_names, values, extra)} {value}")
+        return "\n".join(lines)
+
+
+class _Value:
+    __slots__ = ("value", "lock")
+
+    def __init__(self, lock):
+        self.value = 0
+        self.lock = lock
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value(self.lock)
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value(self.lock)
+
+    def set(self, value):
+        self.labels().set(value)
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count", "lock")
+
+    def __init__(self, buckets, lock):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)     # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.lock = lock
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, label_names)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets, self.lock)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self, *label_values):
+        return self.labels(*label_values).time()
+
+    def _samples(self):
+        samples = []
+        for key, child in list(self.children.items()):
+            with self.lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), counts):
+                cumulative += n
+                samples.append(("_bucket", key, (f'le="{bound}"',), cumulative))
+            samples.append(("_sum", key, (), total))
+            samples.append(("_count", key, (), count))
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, help, labels=(), fn=None):
+        return self._register(Counter, name, help, labels, fn=fn)
+
+    def gauge(self, name, help, labels=(), fn=None):
+        return self._register(Gauge, name, help, labels, fn=fn)
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, help, labels, buckets=buckets)
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+registry = MetricsRegistry()
@@ -1,39 +1,273 @@
 import threading
+import time
+import uuid
 from datetime import datetime
+from Config.Config import Config
+from services.shared_backend import shared_backend
+from services.metrics import registry
+from Utils.log import get_logger
+
+log = get_logger("presence")
+
+class _Presence:
+    __slots__ = ("sids", "last_seen")
+
+    def __init__(self):
+        self.sids = set()
+        self.last_seen = None
+
+
+class _Shard:
+    __slots__ = ("lock", "users")
 
-class OnlineUsersManager:
     def __init__(self):
-        self.online_users = {}
-        self.refresh_timers = {}
         self.lock = threading.Lock()
+        self.users = {}         # uid -> _Presence
+
+
+class OnlineUsersManager:
+    """
+    In-process presence registry.
+
+    Users are spread over `shards` dicts, each with its own lock, so
+    connects and disconnects for different users rarely contend. A sid ->
+    uid reverse index makes disconnects O(1). A user can hold several sids,
+    one per device, and is online while any of them is connected.
+    """
+
+    def __init__(self, shards=16):
+        self.shards = [_Shard() for _ in range(shards)]
+        self.sid_index = {}     # sid -> uid
+        self.sid_lock = threading.Lock()
+
+    def _shard(self, uid):
+        return self.shards[hash(uid) % len(self.shards)]
 
     def add_user(self, user_id, sid):
-        with self.lock:
-            self.online_users[user_id] = {
-                "sid": sid,
-                "last_seen": datetime.utcnow().isoformat()
-            }
-
-    def remove_user(self, user_id):
-        with self.lock:
-            self.online_users.pop(user_id, None)
-
-    def remove_user_by_sid(self, sid):
-        with self.lock:
-            for uid, data in list(self.online_users.items()):
-                if data["sid"] == sid:
-                    del self.online_users[uid]
-                    return uid
+        """Register a connected sid. Returns True if the user just came online."""
+        uid = str(user_id)
+        with self.sid_lock:
+            self.sid_index[sid] = uid
+
+        shard = self._shard(uid)
+        with shard.lock:
+            presence = shard.users.get(uid)
+            came_online = presence is None
+            if came_online:
+                presence = shard.users[uid] = _Presence()
+            presence.sids.add(sid)
+            presence.last_seen = datetime.utcnow().isoformat()
+        return came_online
+
+    def remove_sid(self, sid):
+        """Drop a disconnected sid. Returns (uid, went_offline); uid is None for unknown sids."""
+        with self.sid_lock:
+            uid = self.sid_index.pop(sid, None)
+        if uid is None:
+            return None, False
+
+        shard = self._shard(uid)
+        with shard.lock:
+            presence = shard.users.get(uid)
+            if presence is None:
+                return uid, False
+            presence.sids.discard(sid)
+            if presence.sids:
+                return uid, False
+            del shard.users[uid]
+        return uid, True
+
+    def get_user_sids(self, user_id):
+        uid = str(user_id)
+        shard = self._shard(uid)
+        with shard.lock:
+            presence = shard.users.get(uid)
+            return list(presence.sids) if presence else []
+
+    def has_sid(self, user_id, sid):
+        with self.sid_lock:
+            return self.sid_index.get(sid) == str(user_id)
+
+    def is_online(self, user_id):
+        uid = str(user_id)
+        shard = self._shard(uid)
+        with shard.lock:
+            return uid in shard.users
+
+    def get_all_users(self):
+        """Consistent snapshot: every shard is locked while it is copied."""
+        for shard in self.shards:
+            shard.lock.acquire()
+        try:
+            return [uid for shard in self.shards for uid in shard.users]
+        finally:
+            for shard in self.shards:
+                shard.lock.release()
+
+    def count(self):
+        return sum(len(shard.users) for shard in self.shards)
+
+    def start(self, socketio, on_offline=None):
+        pass
+
+
+# Connect: KEYS = sid index, the user's sids, this worker's sids, last seen,
+# online set; ARGV = sid, uid, timestamp. Returns 1 if the user came online.
+_ADD_SID = """
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('SADD', KEYS[2], ARGV[1])
+redis.call('SADD', KEYS[3], ARGV[1])
+redis.call('HSET', KEYS[4], ARGV[2], ARGV[3])
+return redis.call('SADD', KEYS[5], ARGV[2])
+"""
+
+# Disconnect: KEYS = sid index, online set, owning worker's sids; ARGV = sid,
+# and the prefix / suffix of the per-user sid key (the uid is only known
+# once the sid is looked up). Returns nil for an unknown sid, else
+# {uid, 1 if the user went offline}.
+_DROP_SID = """
+redis.call('SREM', KEYS[3], ARGV[1])
+local uid = redis.call('HGET', KEYS[1], ARGV[1])
+if not uid then return nil end
+redis.call('HDEL', KEYS[1], ARGV[1])
+local user_sids = ARGV[2] .. uid .. ARGV[3]
+redis.call('SREM', user_sids, ARGV[1])
+if redis.call('SCARD', user_sids) > 0 then return {uid, 0} end
+return {uid, redis.call('SREM', KEYS[2], uid)}
+"""
+
+
+def _add_sid(backend, keys, args):
+    sids, user_sids, worker_sids, last_seen, online = keys
+    sid, uid, now = args
+    backend.hset(sids, sid, uid)
+    backend.sadd(user_sids, sid)
+    backend.sadd(worker_sids, sid)
+    backend.hset(last_seen, uid, now)
+    return backend.sadd(online, uid)
+
+
+def _drop_sid(backend, keys, args):
+    sids, online, worker_sids = keys
+    sid, prefix, suffix = args
+    backend.srem(worker_sids, sid)
+    uid = backend.hget(sids, sid)
+    if uid is None:
         return None
+    backend.hdel(sids, sid)
+    user_sids = prefix + uid + suffix
+    backend.srem(user_sids, sid)
+    if backend.scard(user_sids):
+        return [uid, 0]
+    return [uid, backend.srem(online, uid)]
+
+
+class SharedOnlineUsersManager:
+    """
+    Presence stored in the shared backend so every worker behind the load
+    balancer sees the same online set.
+
+    Each worker heartbeats a key with a TTL and tracks the sids it owns.
+    When a worker dies, the survivors reap its sids, so its users don't
+    stay online forever. A connect or disconnect touches several keys and
+    runs as one script, so two workers racing on the same user can't
+    leave the online set disagreeing with the user's sids.
+    """
+
+    ONLINE = "presence:online"          # set of online uids
+    SIDS = "presence:sids"              # sid -> uid
+    LAST_SEEN = "presence:last_seen"    # uid -> iso timestamp
+    WORKERS = "presence:workers"        # ids of live workers
+    USER_SIDS = "presence:user:{}:sids" # sids of one uid
+    HEARTBEAT_TTL = 30
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.worker_id = uuid.uuid4().hex
+        self._add = backend.script(_ADD_SID, _add_sid)
+        self._drop = backend.script(_DROP_SID, _drop_sid)
+
+    def _user_sids(self, uid):
+        return self.USER_SIDS.format(uid)
+
+    def _worker_sids(self, worker_id):
+        return f"presence:worker:{worker_id}:sids"
+
+    def _worker_alive(self, worker_id):
+        return f"presence:worker:{worker_id}:alive"
 
-    def get_user_sid(self, user_id):
-        return self.online_users.get(user_id, {}).get("sid")
+    def add_user(self, user_id, sid):
+        uid = str(user_id)
+        keys = [self.SIDS, self._user_sids(uid), self._worker_sids(self.worker_id), self.LAST_SEEN, self.ONLINE]
+        return self._add(keys, [sid, uid, datetime.utcnow().isoformat()]) == 1
+
+    def _drop_sid(self, sid, worker_id):
+        result = self._drop([self.SIDS, self.ONLINE, self._worker_sids(worker_id)], [sid, *self.USER_SIDS.split("{}")])
+        if result is None:
+            return None, False
+        uid, went_offline = result
+        return uid, int(went_offline) == 1
+
+    def remove_sid(self, sid):
+        return self._drop_sid(sid, self.worker_id)
+
+    def get_user_sids(self, user_id):
+        return list(self.backend.smembers(self._user_sids(str(user_id))))
+
+    def has_sid(self, user_id, sid):
+        return self.backend.hget(self.SIDS, sid) == str(user_id)
 
     def is_online(self, user_id):
-        return user_id in self.online_users
+        return self.backend.sismember(self.ONLINE, str(user_id))
 
     def get_all_users(self):
-        return list(self.online_users.keys())
-    
+        return list(self.backend.smembers(self.ONLINE))
+
+    def count(self):
+        return self.backend.scard(self.ONLINE)
+
+    # ---------------- worker liveness ----------------
+    def heartbeat(self):
+        self.backend.set(self._worker_alive(self.worker_id), "1", ttl=self.HEARTBEAT_TTL)
+        self.backend.sadd(self.WORKERS, self.worker_id)
+
+    def reap_dead_workers(self):
+        """Drop presence owned by workers whose heartbeat expired. Returns the uids that went offline."""
+        offline = []
+        for worker_id in self.backend.smembers(self.WORKERS):
+            if worker_id == self.worker_id or self.backend.get(self._worker_alive(worker_id)):
+                continue
+
+            key = self._worker_sids(worker_id)
+            for sid in self.backend.smembers(key):
+                uid, went_offline = self._drop_sid(sid, worker_id)
+                if went_offline:
+                    offline.append(uid)
+            self.backend.delete(key)
+            self.backend.srem(self.WORKERS, worker_id)
+            log.info("presence_reaped", worker=worker_id, users=len(offline))
+        return offline
+
+    def start(self, socketio, on_offline=None):
+        def loop():
+            while True:
+                try:
+                    self.heartbeat()
+                    for uid in self.reap_dead_workers():
+                        if on_offline:
+                            on_offline(uid)
+                except Exception as e:
+                    log.error("presence_heartbeat_failed", error=str(e))
+                time.sleep(self.HEARTBEAT_TTL / 3)
+
+        self.heartbeat()
+        socketio.start_background_task(loop)
+
+
+# Several workers share presence through the backend; a single worker keeps it in memory.
+if Config.SOCKETIO_MESSAGE_QUEUE:
+    online_manager = SharedOnlineUsersManager(shared_backend)
+else:
+    online_manager = OnlineUsersManager(shards=Config.PRESENCE_SHARDS)
 
-online_manager = OnlineUsersManager()
+registry.gauge("connext_online_users", "Users with at least one connected socket", fn=lambda: online_manager.count())
@@ -0,0 +1,123 @@
+import threading
+import time
+from eventlet import patcher, tpool
+from Config.Config import Config
+from extensions import bcrypt
+from services.metrics import registry
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when too many hashes are queued already; answer 503 and let the client retry."""
+
+
+class PasswordPool:
+    """
+    Runs bcrypt off the event loop.
+
+    bcrypt is CPU-bound C code that never yields to eventlet, so a hash run
+    in the request greenlet freezes every socket on the process for its
+    whole duration. Once eventlet.monkey_patch() has run, hashes go to
+    eventlet's native thread pool (tpool, EVENTLET_THREADPOOL_SIZE threads)
+    and the greenlet just waits for the result. Without monkey patching
+    they run in the calling thread, which is then a real thread anyway.
+
+    At most `workers` hashes run at once and at most `max_queue` wait for
+    a slot; past that, or after waiting `timeout` seconds, PasswordPoolBusy
+    is raised straight away instead of piling up logins behind each other.
+    """
+
+    def __init__(self, rounds=12, workers=2, max_queue=32, timeout=5):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+
+        self._running = 0
+        self._waiting = 0
+        self._cond = threading.Condition(threading.Lock())
+
+        self._completed = 0
+        self._rejected = 0
+        self._hash_time = 0.0
+
+    def _offload(self, fn, *args):
+        if patcher.is_monkey_patched("thread"):
+            return tpool.execute(fn, *args)
+        return fn(*args)
+
+    def _run(self, fn, *args):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            if self._running >= self.workers and self._waiting >= self.max_queue:
+                self._rejected += 1
+                raise PasswordPoolBusy(f"{self._waiting} password hashes already queued")
+
+            while self._running >= self.workers:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._rejected += 1
+                    raise PasswordPoolBusy(f"no password worker free after {self.timeout}s")
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._running += 1
+
+        start = time.perf_counter()
+        try:
+            return self._offload(fn, *args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._cond:
+                self._running -= 1
+                self._completed += 1
+                self._hash_time += elapsed
+                self._cond.notify()
+
+    # ---------------- hashing ----------------
+    def hash(self, password: str) -> str:
+        hashed = self._run(bcrypt.generate_password_hash, password, self.rounds)
+        return hashed.decode("utf-8")
+
+    def check(self, stored_hash: str, password: str) -> bool:
+        return self._run(bcrypt.check_password_hash, stored_hash, password)
+
+    @staticmethod
+    def cost(stored_hash: str):
+        """The cost factor of a "$2b$12$..." hash, or None if it isn't one."""
+        try:
+            return int(stored_hash.split("$")[2])
+        except (AttributeError, IndexError, ValueError):
+            return None
+
+    def needs_rehash(self, stored_hash: str) -> bool:
+        return self.cost(stored_hash) != self.rounds
+
+    def stats(self):
+        with self._cond:
+            return {
+                "rounds": self.rounds,
+                "workers": self.workers,
+                "running": self._running,
+                "waiting": self._waiting,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_ms": round(self._hash_time / self._completed * 1000, 1) if self._completed else None,
+            }
+
+
+password_pool = PasswordPool(
+    rounds=Config.BCRYPT_LOG_ROUNDS,
+    workers=Config.BCRYPT_WORKERS,
+    max_queue=Config.BCRYPT_MAX_QUEUE,
+    timeout=Config.BCRYPT_QUEUE_TIMEOUT,
+)
+registry.gauge(
+    "connext_password_pool", "Password hashes running and waiting", ["state"],
+    fn=lambda: {(k,): v for k, v in password_pool.stats().items() if k in ("running", "waiting")},
+)
+registry.counter(
+    "connext_password_hashes_total", "Password hashes done or refused as busy", ["result"],
+    fn=lambda: {(k,): v for k, v in password_pool.stats().items() if k in ("completed", "rejected")},
+)
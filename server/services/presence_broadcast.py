@@ -0,0 +1,132 @@
+import threading
+import time
+from Config.Config import Config
+from database.db import fetch_all
+from services.online_users import online_manager
+from services.shared_backend import shared_backend
+from Utils.log import get_logger
+
+log = get_logger("presence")
+
+
+class PresenceBroadcaster:
+    """
+    Sends presence changes only to a user's contacts (the people they have a
+    conversation with), instead of broadcasting to every socket.
+
+    Transitions are collected for `window` seconds and flushed together: a
+    user who drops and reconnects inside the window is compared against
+    their state before it and produces no event. Each flush sends one
+    `presence_delta` per recipient, stamped with a version from the shared
+    backend so clients can discard deltas older than their snapshot.
+    """
+
+    VERSION_KEY = "presence:version"
+
+    def __init__(self, window=2.0, contacts_ttl=300):
+        self.window = window
+        self.contacts_ttl = contacts_ttl
+        self.pending = {}       # uid -> online state before the first change in this window
+        self.contacts = {}      # uid -> (expires_at, set of uids)
+        self.lock = threading.Lock()
+
+    # ---------------- contacts ----------------
+    def contacts_of(self, user_id):
+        uid = str(user_id)
+        now = time.monotonic()
+        with self.lock:
+            cached = self.contacts.get(uid)
+            if cached and cached[0] > now:
+                return cached[1]
+
+        rows = fetch_all(
+            """
+            SELECT user_high AS other_id FROM conversations WHERE user_low = %(uid)s AND user_high <> %(uid)s
+            UNION ALL
+            SELECT user_low AS other_id FROM conversations WHERE user_high = %(uid)s AND user_low <> %(uid)s
+            """,
+            {"uid": int(uid)},
+        )
+        found = frozenset(str(r["other_id"]) for r in rows)
+        with self.lock:
+            self.contacts[uid] = (now + self.contacts_ttl, found)
+        return found
+
+    def add_contact(self, user1, user2):
+        """Record a conversation between two users. Returns True if it is new to this worker."""
+        user1, user2 = str(user1), str(user2)
+        if user1 == user2:
+            return False
+        added = False
+        with self.lock:
+            for a, b in ((user1, user2), (user2, user1)):
+                cached = self.contacts.get(a)
+                if cached and b not in cached[1]:
+                    self.contacts[a] = (cached[0], cached[1] | {b})
+                    added = True
+        return added
+
+    # ---------------- state ----------------
+    def version(self):
+        return int(shared_backend.get(self.VERSION_KEY) or 0)
+
+    def snapshot(self, user_id):
+        """Online contacts of `user_id`, with the version deltas should be applied on top of."""
+        return {
+            "version": self.version(),
+            "online_users": [c for c in self.contacts_of(user_id) if online_manager.is_online(c)],
+        }
+
+    def mark(self, user_id, online):
+        with self.lock:
+            self.pending.setdefault(str(user_id), not online)
+
+    # ---------------- fan-out ----------------
+    def flush(self, socketio):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            now = time.monotonic()
+            self.contacts = {uid: c for uid, c in self.contacts.items() if c[0] > now}
+
+        deltas = {}
+        try:
+            for uid, was_online in pending.items():
+                is_online = online_manager.is_online(uid)
+                if is_online == was_online:
+                    continue    # flapped back within the window
+                key = "online" if is_online else "offline"
+                for contact in self.contacts_of(uid):
+                    if online_manager.is_online(contact):
+                        deltas.setdefault(contact, {"online": [], "offline": []})[key].append(uid)
+        except Exception:
+            # Keep the changes for the next flush
+            with self.lock:
+                for uid, was_online in pending.items():
+                    self.pending.setdefault(uid, was_online)
+            raise
+
+        if not deltas:
+            return 0
+
+        version = shared_backend.incr(self.VERSION_KEY)
+        for contact, delta in deltas.items():
+            socketio.emit("presence_delta", {"version": version, **delta}, room=f"user_{contact}")
+        return len(deltas)
+
+    def run(self, socketio, app):
+        while True:
+            socketio.sleep(self.window)
+            try:
+                with app.app_context():
+                    self.flush(socketio)
+            except Exception as e:
+                log.error("presence_flush_failed", error=str(e))
+
+    def start(self, socketio, app):
+        socketio.start_background_task(self.run, socketio, app)
+
+
+presence_broadcaster = PresenceBroadcaster(
+    window=Config.PRESENCE_COALESCE_WINDOW,
+    contacts_ttl=Config.PRESENCE_CONTACTS_TTL,
+)
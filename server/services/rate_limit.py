@@ -0,0 +1,178 @@
+"""
+Token-bucket rate limits for REST routes and socket events.
+
+Each RateLimiter allows `rate` hits per second per key (a uid, an IP, a
+sid) with bursts of up to `burst`. In memory a bucket is a single float,
+the time at which it will be full again (GCRA), so a full bucket carries
+no state at all and is evicted by the periodic sweep.
+
+With backend="shared" the counts live in the shared backend instead, so
+every worker enforces one limit. The backend only offers INCR with a TTL,
+so there the bucket becomes a fixed window of `burst` hits per
+burst/rate seconds: the same average rate, with bursts of up to twice
+`burst` at a window boundary.
+
+    @auth_bp.route("/api/login", methods=["POST"])
+    @limit_route(login_limiter, by="ip")
+    def login(): ...
+
+    @socketio.on("send_message")
+    @authenticated
+    @limit_event(send_limiter)
+    def handle_send_message(session, data): ...
+"""
+import functools
+import math
+import threading
+import time
+from flask import request, jsonify
+from flask_jwt_extended import get_jwt_identity
+from flask_socketio import emit
+from Config.Config import Config
+from services.shared_backend import shared_backend
+from services.metrics import registry
+
+rejections = registry.counter("connext_rate_limited_total", "Hits refused by a rate limiter", ["limiter"])
+
+
+class RateLimiter:
+    def __init__(self, name, rate, burst, backend="memory", sweep_interval=60):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.interval = 1.0 / rate              # seconds one hit "costs"
+        self.shared = backend == "shared"
+        self.window = burst / rate              # shared mode only
+        self.sweep_interval = sweep_interval
+
+        self.full_at = {}                       # key -> when the bucket is full again
+        self.lock = threading.Lock()
+        self.last_sweep = time.monotonic()
+
+        self.allowed = 0
+        self.rejected = 0
+
+    def _hit_memory(self, key, now):
+        with self.lock:
+            full_at = max(self.full_at.get(key, now), now)
+            new_full_at = full_at + self.interval
+            # The bucket holds `burst` hits: refuse if this one would overflow it
+            if new_full_at - now > self.burst * self.interval:
+                return False, full_at + self.interval - now - self.burst * self.interval
+            self.full_at[key] = new_full_at
+
+            if now - self.last_sweep >= self.sweep_interval:
+                self._sweep(now)
+        return True, 0.0
+
+    def _hit_shared(self, key, now):
+        bucket = int(now // self.window)
+        count = shared_backend.incr(
+            f"ratelimit:{self.name}:{key}:{bucket}", ttl=math.ceil(self.window) + 1
+        )
+        if count > self.burst:
+            return False, (bucket + 1) * self.window - now
+        return True, 0.0
+
+    def hit(self, key):
+        """
+        Record one hit for `key`. Returns (allowed, retry_after seconds).
+        """
+        if self.shared:
+            allowed, retry_after = self._hit_shared(key, time.time())
+        else:
+            allowed, retry_after = self._hit_memory(key, time.monotonic())
+        if allowed:
+            self.allowed += 1
+        else:
+            self.rejected += 1
+            rejections.labels(self.name).inc()
+        return allowed, retry_after
+
+    def allow(self, key):
+        return self.hit(key)[0]
+
+    def forget(self, key):
+        with self.lock:
+            self.full_at.pop(key, None)
+
+    def _sweep(self, now):
+        # Full buckets are the default state; drop them
+        self.full_at = {key: t for key, t in self.full_at.items() if t > now}
+        self.last_sweep = now
+
+    def sweep(self):
+        with self.lock:
+            self._sweep(time.monotonic())
+
+    def __len__(self):
+        return len(self.full_at)
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "rate": self.rate,
+            "burst": self.burst,
+            "buckets": len(self.full_at),
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+        }
+
+
+def client_ip():
+    if Config.RATE_LIMIT_TRUST_FORWARDED:
+        # First address in X-Forwarded-For, as set by our proxy
+        return request.access_route[0] if request.access_route else request.remote_addr
+    return request.remote_addr
+
+
+def limit_route(limiter, by="ip"):
+    """Flask decorator: 429 with Retry-After once the caller's bucket is empty."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if by == "user":
+                # Goes below @jwt_required()
+                key = get_jwt_identity() or client_ip()
+            else:
+                key = client_ip()
+            allowed, retry_after = limiter.hit(key)
+            if not allowed:
+                response = jsonify({"err": "Too many requests, slow down"})
+                response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+                return response, 429
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def limit_event(limiter):
+    """
+    Socket.IO handler wrapper, below @authenticated: limits per uid and
+    answers a dropped event with `rate_limited` to the sender.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(session, *args):
+            allowed, retry_after = limiter.hit(session.uid)
+            if not allowed:
+                emit("rate_limited", {"event": limiter.name, "retry_after": round(retry_after, 2)}, room=request.sid)
+                return
+            return handler(session, *args)
+        return wrapper
+    return decorator
+
+
+def _limiter(name, rate, burst):
+    return RateLimiter(name, rate, burst, backend=Config.RATE_LIMIT_BACKEND)
+
+
+# Per IP
+login_limiter = _limiter("login", Config.RATE_LIMIT_LOGIN_RATE, Config.RATE_LIMIT_LOGIN_BURST)
+register_limiter = _limiter("register", Config.RATE_LIMIT_REGISTER_RATE, Config.RATE_LIMIT_REGISTER_BURST)
+# Per user
+send_limiter = _limiter("send_message", Config.RATE_LIMIT_SEND_RATE, Config.RATE_LIMIT_SEND_BURST)
+reaction_limiter = _limiter("add_reaction", Config.RATE_LIMIT_REACTION_RATE, Config.RATE_LIMIT_REACTION_BURST)
+edit_limiter = _limiter("edit_message", Config.RATE_LIMIT_EDIT_RATE, Config.RATE_LIMIT_EDIT_BURST)
+
+limiters = [login_limiter, register_limiter, send_limiter, reaction_limiter, edit_limiter]
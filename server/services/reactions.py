@@ -0,0 +1,81 @@
+"""
+Message reactions, stored one row per (message, user) in message_reactions
+(see database/migrations/0005_message_reactions.sql).
+
+A toggle is one synchronous transaction on the user's row; there is no
+write-behind aggregator and no stored per-message totals. Only the two
+people in a conversation may react, so a message has at most two rows and
+counts() derives the totals from the rows that load() already returns.
+
+Like services/conversations.py, every function takes the caller's cursor and
+does not commit.
+"""
+
+VALID_REACTIONS = ("like", "love", "haha", "wow", "sad", "angry", "okay")
+
+
+def toggle(cur, message_id, user_id, reaction_type):
+    """
+    Apply a click on `reaction_type`: the same reaction again removes it,
+    a different one replaces the user's previous reaction.
+
+    Returns (removed_type, added_type); either may be None.
+    """
+    message_id, user_id = int(message_id), int(user_id)
+
+    # Serialise this user's clicks on this message. A row lock can't do it:
+    # before the first reaction there is no row to lock
+    cur.execute("SELECT pg_advisory_xact_lock(%s, %s)", (message_id, user_id))
+
+    cur.execute(
+        "SELECT reaction_type FROM message_reactions WHERE message_id = %s AND user_id = %s",
+        (message_id, user_id),
+    )
+    row = cur.fetchone()
+    previous = row["reaction_type"] if row else None
+
+    if previous == reaction_type:
+        cur.execute(
+            "DELETE FROM message_reactions WHERE message_id = %s AND user_id = %s",
+            (message_id, user_id),
+        )
+        return reaction_type, None
+
+    cur.execute(
+        """
+        INSERT INTO message_reactions (message_id, user_id, reaction_type)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (message_id, user_id) DO UPDATE
+        SET reaction_type = EXCLUDED.reaction_type, created_at = NOW()
+        """,
+        (message_id, user_id, reaction_type),
+    )
+    return previous, reaction_type
+
+
+def load(cur, message_ids):
+    """
+    Reactions for many messages in one query, in the shape the client has
+    always used: {message_id: {reaction_type: [user_id, ...]}}.
+    """
+    if not message_ids:
+        return {}
+
+    cur.execute(
+        """
+        SELECT message_id, reaction_type, array_agg(user_id::text ORDER BY created_at) AS users
+        FROM message_reactions
+        WHERE message_id = ANY(%s)
+        GROUP BY message_id, reaction_type
+        """,
+        (list(message_ids),),
+    )
+    found = {}
+    for row in cur.fetchall():
+        found.setdefault(row["message_id"], {})[row["reaction_type"]] = row["users"]
+    return found
+
+
+def counts(by_type):
+    """{reaction_type: count} from one message's {reaction_type: [user_id, ...]}."""
+    return {reaction_type: len(users) for reaction_type, users in (by_type or {}).items()}
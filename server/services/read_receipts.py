@@ -0,0 +1,95 @@
+import threading
+from Config.Config import Config
+from database.db import get_connection
+from Utils.rooms import private_room
+from services import conversations
+from Utils.log import get_logger
+
+log = get_logger("read_receipts")
+
+
+def mark_seen(cur, viewer_id, other_id, up_to=None):
+    """
+    Mark what `other_id` sent to `viewer_id` as seen, up to message `up_to`
+    (everything when None), as one range update. Returns (seen_count,
+    seen_up_to); seen_up_to is None when nothing was unseen. Doesn't commit.
+    """
+    cur.execute(
+        """
+        WITH updated AS (
+            UPDATE messages
+            SET is_seen = TRUE
+            WHERE sender_id = %(other)s AND receiver_id = %(viewer)s AND is_seen = FALSE
+              AND (%(up_to)s::int IS NULL OR message_id <= %(up_to)s::int)
+            RETURNING message_id
+        )
+        SELECT COUNT(*) AS seen_count, MAX(message_id) AS seen_up_to FROM updated
+        """,
+        {"other": int(other_id), "viewer": int(viewer_id), "up_to": up_to},
+    )
+    row = cur.fetchone()
+    if row["seen_count"]:
+        conversations.record_seen(cur, viewer_id, other_id, row["seen_count"], row["seen_up_to"])
+    return row["seen_count"], row["seen_up_to"]
+
+
+def emit_seen(socketio, viewer_id, other_id, seen_count, seen_up_to):
+    """One messages_seen event for the whole range, instead of one per message."""
+    socketio.emit(
+        "messages_seen",
+        {
+            "sender_id": str(other_id),
+            "receiver_id": str(viewer_id),
+            "updated_count": seen_count,
+            "seen_up_to": seen_up_to,
+        },
+        room=private_room(other_id, viewer_id),
+        namespace="/",
+    )
+
+
+class ReadReceiptBatcher:
+    """
+    Coalesces per-message "seen" reports from a scrolling client.
+
+    Reports only raise a pending watermark per viewer and sender; the first
+    one schedules a flush `window` seconds later, which does one range update
+    and emits one event for everything reported in between.
+    """
+
+    def __init__(self, window=0.5):
+        self.window = window
+        self.pending = {}       # (viewer_id, sender_id) -> highest message_id reported
+        self.lock = threading.Lock()
+
+    def report(self, socketio, viewer_id, sender_id, message_id):
+        key = (str(viewer_id), str(sender_id))
+        with self.lock:
+            scheduled = key in self.pending
+            self.pending[key] = max(self.pending.get(key, 0), int(message_id))
+        if not scheduled:
+            socketio.start_background_task(self._flush_later, socketio, key)
+
+    def _flush_later(self, socketio, key):
+        socketio.sleep(self.window)
+        with self.lock:
+            up_to = self.pending.pop(key, None)
+        if up_to is None:
+            return
+
+        viewer_id, sender_id = key
+        try:
+            with get_connection() as conn:
+                cur = conn.cursor()
+                seen_count, seen_up_to = mark_seen(cur, viewer_id, sender_id, up_to)
+                conn.commit()
+                cur.close()
+        except Exception as e:
+            log.error("read_receipt_failed", viewer=viewer_id, sender=sender_id, error=str(e))
+            return
+
+        if seen_count:
+            emit_seen(socketio, viewer_id, sender_id, seen_count, seen_up_to)
+
+
+read_receipts = ReadReceiptBatcher(window=Config.READ_RECEIPT_WINDOW)
@@ -0,0 +1,222 @@
+"""
+Key/value backend for state that every worker process must agree on
+(presence, counters).
+
+    memory://            in-process stand-in, for one worker and for tests
+    redis://host:6379/0  shared between workers (needs the `redis` package)
+
+Both expose the same small subset of Redis commands, with string values.
+Several commands that must apply together go through script(): a Lua
+script on Redis, the equivalent Python function under the backend's lock
+in memory.
+"""
+import threading
+import time
+from Config.Config import Config
+
+
+class MemoryBackend:
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        # Re-entrant: a script's Python twin calls the commands below while holding it
+        self.lock = threading.RLock()
+
+    def _live(self, key):
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key)
+
+    # ---------------- strings ----------------
+    def get(self, key):
+        with self.lock:
+            return self._live(key)
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self.data[key] = str(value)
+            if ttl:
+                self.expires[key] = time.monotonic() + ttl
+            else:
+                self.expires.pop(key, None)
+
+    def incr(self, key, amount=1, ttl=None):
+        """Increment a counter; `ttl` is only applied when the key is created."""
+        with self.lock:
+            current = self._live(key)
+            value = int(current or 0) + amount
+            self.data[key] = str(value)
+            if current is None and ttl:
+                self.expires[key] = time.monotonic() + ttl
+            return value
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.data.pop(key, None)
+                self.expires.pop(key, None)
+
+    # ---------------- hashes ----------------
+    def hset(self, key, field, value):
+        with self.lock:
+            self.data.setdefault(key, {})[field] = str(value)
+
+    def hget(self, key, field):
+        with self.lock:
+            return (self._live(key) or {}).get(field)
+
+    def hdel(self, key, *fields):
+        with self.lock:
+            h = self._live(key) or {}
+            removed = sum(1 for f in fields if h.pop(f, None) is not None)
+            if not h:
+                self.data.pop(key, None)
+            return removed
+
+    def hgetall(self, key):
+        with self.lock:
+            return dict(self._live(key) or {})
+
+    def hkeys(self, key):
+        with self.lock:
+            return list(self._live(key) or {})
+
+    # ---------------- sets ----------------
+    def sadd(self, key, *members):
+        with self.lock:
+            s = self.data.setdefault(key, set())
+            before = len(s)
+            s.update(str(m) for m in members)
+            return len(s) - before
+
+    def srem(self, key, *members):
+        with self.lock:
+            s = self._live(key) or set()
+            before = len(s)
+            s.difference_update(str(m) for m in members)
+            if not s:
+                self.data.pop(key, None)
+            return before - len(s)
+
+    def smembers(self, key):
+        with self.lock:
+            return set(self._live(key) or ())
+
+    def scard(self, key):
+        with self.lock:
+            return len(self._live(key) or ())
+
+    def sismember(self, key, member):
+        with self.lock:
+            return str(member) in (self._live(key) or ())
+
+    # ---------------- lists ----------------
+    def rpush(self, key, *values):
+        with self.lock:
+            items = self.data.setdefault(key, [])
+            items.extend(str(v) for v in values)
+            return len(items)
+
+    def lrange(self, key, start, end):
+        with self.lock:
+            items = self._live(key) or []
+            end = len(items) if end == -1 else end + 1
+            return list(items[start:end])
+
+    def ltrim(self, key, start, end):
+        with self.lock:
+            items = self._live(key)
+            if items is not None:
+                end = len(items) if end == -1 else end + 1
+                self.data[key] = items[start:end]
+
+    # ---------------- scripts ----------------
+    def script(self, lua, fallback):
+        """Callable(keys, args) running `fallback(backend, keys, args)` atomically."""
+        def run(keys, args):
+            with self.lock:
+                return fallback(self, keys, [str(a) for a in args])
+        return run
+
+
+class RedisBackend:
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError(f"SHARED_BACKEND_URL={url} needs the `redis` package (pip install redis)")
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, value, ex=ttl)
+
+    def incr(self, key, amount=1, ttl=None):
+        pipe = self.client.pipeline()
+        if ttl:
+            pipe.set(key, 0, ex=ttl, nx=True)
+        pipe.incrby(key, amount)
+        return pipe.execute()[-1]
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*keys)
+
+    def hset(self, key, field, value):
+        self.client.hset(key, field, value)
+
+    def hget(self, key, field):
+        return self.client.hget(key, field)
+
+    def hdel(self, key, *fields):
+        return self.client.hdel(key, *fields) if fields else 0
+
+    def hgetall(self, key):
+        return self.client.hgetall(key)
+
+    def hkeys(self, key):
+        return self.client.hkeys(key)
+
+    def sadd(self, key, *members):
+        return self.client.sadd(key, *members) if members else 0
+
+    def srem(self, key, *members):
+        return self.client.srem(key, *members) if members else 0
+
+    def smembers(self, key):
+        return self.client.smembers(key)
+
+    def scard(self, key):
+        return self.client.scard(key)
+
+    def sismember(self, key, member):
+        return bool(self.client.sismember(key, member))
+
+    def rpush(self, key, *values):
+        return self.client.rpush(key, *values) if values else 0
+
+    def lrange(self, key, start, end):
+        return self.client.lrange(key, start, end)
+
+    def ltrim(self, key, start, end):
+        self.client.ltrim(key, start, end)
+
+    def script(self, lua, fallback):
+        """Callable(keys, args) running `lua` with EVALSHA (loaded on first use)."""
+        script = self.client.register_script(lua)
+        return lambda keys, args: script(keys=keys, args=args)
+
+
+def create_backend(url):
+    if not url or url.startswith("memory://"):
+        return MemoryBackend()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported SHARED_BACKEND_URL: {url}")
+
+
+shared_backend = create_backend(Config.SHARED_BACKEND_URL)
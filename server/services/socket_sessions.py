@@ -0,0 +1,77 @@
+"""
+Per-socket session context.
+
+handle_connect verifies the JWT once and registers a SocketSession for the
+sid. Event handlers decorated with @authenticated receive it as their first
+argument and take the caller's uid from it, never from the payload.
+"""
+import functools
+import threading
+import time
+from flask import request
+from flask_socketio import emit
+from services.metrics import registry
+
+event_seconds = registry.histogram("connext_socket_event_seconds", "Socket.IO handler time by event", ["event"])
+
+
+class SocketSession:
+    __slots__ = ("sid", "uid", "claims", "rooms", "connected_at")
+
+    def __init__(self, sid, uid, claims):
+        self.sid = sid
+        self.uid = str(uid)
+        self.claims = claims
+        self.rooms = set()
+        self.connected_at = time.time()
+
+
+class SessionRegistry:
+    def __init__(self):
+        self.sessions = {}      # sid -> SocketSession
+        self.lock = threading.Lock()
+
+    def open(self, sid, uid, claims):
+        session = SocketSession(sid, uid, claims)
+        with self.lock:
+            self.sessions[sid] = session
+        return session
+
+    def close(self, sid):
+        with self.lock:
+            return self.sessions.pop(sid, None)
+
+    def get(self, sid):
+        return self.sessions.get(sid)
+
+    def in_room(self, sids, room):
+        """True if any of `sids` (on this worker) joined `room`."""
+        for sid in sids:
+            session = self.sessions.get(sid)
+            if session and room in session.rooms:
+                return True
+        return False
+
+    def __len__(self):
+        return len(self.sessions)
+
+
+socket_sessions = SessionRegistry()
+registry.gauge("connext_socket_sessions", "Authenticated sockets on this worker", fn=lambda: len(socket_sessions))
+
+
+def authenticated(handler):
+    """
+    Inject the caller's SocketSession; drop events from sockets that never
+    authenticated. Also times the handler (connext_socket_event_seconds).
+    """
+    @functools.wraps(handler)
+    def wrapper(*args):
+        session = socket_sessions.get(request.sid)
+        if session is None:
+            emit("error", {"message": "Not authenticated"}, room=request.sid)
+            return
+        event = getattr(request, "event", None) or {}
+        with event_seconds.time(event.get("message", handler.__name__)):
+            return handler(session, *args)
+    return wrapper
@@ -0,0 +1,149 @@
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from Config.Config import Config
+from database.db import fetch_all
+from services.online_users import online_manager
+from Utils.log import get_logger
+
+log = get_logger("token_refresh")
+
+
+class _Refresh:
+    __slots__ = ("deadline", "user_id", "sid", "cancelled")
+
+    def __init__(self, deadline, user_id, sid):
+        self.deadline = deadline
+        self.user_id = user_id
+        self.sid = sid
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return self.deadline < other.deadline
+
+
+class TokenRefreshScheduler:
+    """
+    One background task owns the refresh deadline of every connected socket.
+
+    Deadlines sit in a min-heap. cancel() only flags the entry and drops it
+    from the sid index, so it is O(1), and the loop discards flagged entries
+    as it pops them. Due refreshes are handled in batches with a single
+    user_table lookup per batch.
+    """
+
+    def __init__(self, interval=900, batch_size=500, tick=1.0):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.tick = tick
+        self.heap = []
+        self.by_sid = {}
+        self.lock = threading.Lock()
+        self.refreshed = 0
+        self.failed = 0
+
+    def schedule(self, user_id, sid):
+        entry = _Refresh(time.monotonic() + self.interval, user_id, sid)
+        with self.lock:
+            previous = self.by_sid.pop(sid, None)
+            if previous:
+                previous.cancelled = True
+            self.by_sid[sid] = entry
+            heapq.heappush(self.heap, entry)
+
+    def cancel(self, sid):
+        with self.lock:
+            entry = self.by_sid.pop(sid, None)
+            if entry:
+                entry.cancelled = True
+
+    def pending(self):
+        with self.lock:
+            return len(self.by_sid)
+
+    def _pop_due(self, now):
+        due = []
+        with self.lock:
+            while self.heap and len(due) < self.batch_size:
+                entry = self.heap[0]
+                if entry.cancelled:
+                    heapq.heappop(self.heap)
+                    continue
+                if entry.deadline > now:
+                    break
+                heapq.heappop(self.heap)
+                del self.by_sid[entry.sid]
+                due.append(entry)
+        return due
+
+    def _refresh_batch(self, socketio, due):
+        # Skip sockets that disconnected since they were scheduled
+        due = [e for e in due if online_manager.has_sid(e.user_id, e.sid)]
+        if not due:
+            return
+
+        users = fetch_all(
+            "SELECT uid, username FROM user_table WHERE uid = ANY(%s)",
+            (list({int(e.user_id) for e in due}),),
+        )
+        users = {str(u["uid"]): u for u in users}
+
+        for entry in due:
+            user = users.get(str(entry.user_id))
+            if not user:
+                continue
+
+            new_token = create_access_token(
+                identity=str(user["uid"]),
+                additional_claims={
+                    "uid": user["uid"],
+                    "username": user["username"],
+                },
+                expires_delta=timedelta(minutes=30),
+            )
+            socketio.emit(
+                "token_refreshed",
+                {
+                    "access_token": new_token,
+                    "user_id": user["uid"],
+                    "timestamp": datetime.utcnow().isoformat(),
+                },
+                room=entry.sid,
+            )
+            self.refreshed += 1
+            self.schedule(entry.user_id, entry.sid)
+
+        log.debug("tokens_refreshed", batch=len(due), pending=self.pending())
+
+    def run(self, socketio, app):
+        while True:
+            socketio.sleep(self.tick)
+            due = self._pop_due(time.monotonic())
+            while due:
+                try:
+                    with app.app_context():
+                        self._refresh_batch(socketio, due)
+                except Exception as e:
+                    self.failed += len(due)
+                    log.error("token_refresh_failed", batch=len(due), error=str(e))
+                    # Try these sockets again shortly instead of dropping them
+                    for entry in due:
+                        with self.lock:
+                            if entry.sid not in self.by_sid:
+                                entry.deadline = time.monotonic() + 5
+                                entry.cancelled = False
+                                self.by_sid[entry.sid] = entry
+                                heapq.heappush(self.heap, entry)
+                    break
+                due = self._pop_due(time.monotonic())
+
+    def start(self, socketio, app):
+        socketio.start_background_task(self.run, socketio, app)
+
+
+refresh_scheduler = TokenRefreshScheduler(
+    interval=Config.TOKEN_REFRESH_INTERVAL,
+    batch_size=Config.TOKEN_REFRESH_BATCH_SIZE,
+)
@@ -0,0 +1,135 @@
+import threading
+import time
+from Config.Config import Config
+from Utils.rooms import private_room
+from services.online_users import online_manager
+from services.rate_limit import RateLimiter
+from services.socket_sessions import socket_sessions
+from Utils.log import get_logger
+
+log = get_logger("typing")
+
+
+class _Typing:
+    __slots__ = ("sid", "announced", "last_activity")
+
+    def __init__(self, sid, now):
+        self.sid = sid
+        self.announced = now
+        self.last_activity = now
+
+
+class TypingRelay:
+    """
+    Server side of the typing indicator.
+
+    Clients may send typing_start on every keystroke; the receiver only sees
+    a start when typing begins and again every `dedupe_window` seconds while
+    it goes on. A stop is sent for them after `idle_timeout` seconds without
+    activity, so clients don't have to send typing_stop at all. Each sid may
+    send `rate` events per second (bursts up to `burst`); the rest are
+    dropped, as are events for receivers who couldn't see them.
+    """
+
+    def __init__(self, dedupe_window=3.0, idle_timeout=6.0, rate=5.0, burst=10):
+        self.dedupe_window = dedupe_window
+        self.idle_timeout = idle_timeout
+        self.active = {}        # (sender, receiver) -> _Typing
+        # Per sid, always in-process: sids never move between workers
+        self.limiter = RateLimiter("typing", rate, burst)
+        self.lock = threading.Lock()
+        self.dropped = 0
+
+    def _allow(self, sid):
+        if self.limiter.allow(sid):
+            return True
+        self.dropped += 1
+        return False
+
+    def _receiver_listening(self, socketio, receiver, room):
+        if not online_manager.is_online(receiver):
+            return False
+        if Config.SOCKETIO_MESSAGE_QUEUE:
+            # Room membership of sids on other workers isn't visible from here
+            return True
+        return socket_sessions.in_room(online_manager.get_user_sids(receiver), room)
+
+    def _emit(self, socketio, event, sender, receiver):
+        socketio.emit(
+            event,
+            {"sender_id": sender, "receiver_id": receiver},
+            room=private_room(sender, receiver),
+            namespace="/",
+        )
+
+    def start_typing(self, socketio, sid, sender, receiver):
+        if not self._allow(sid):
+            return
+        now = time.monotonic()
+
+        key = (sender, receiver)
+        with self.lock:
+            typing = self.active.get(key)
+            if typing and now - typing.announced < self.dedupe_window:
+                typing.last_activity = now
+                return
+            if typing is None:
+                typing = self.active[key] = _Typing(sid, now)
+            typing.announced = typing.last_activity = now
+
+        if not self._receiver_listening(socketio, receiver, private_room(sender, receiver)):
+            # Nobody to show it to; forget it so no stop is sent either
+            with self.lock:
+                self.active.pop(key, None)
+            self.dropped += 1
+            return
+        self._emit(socketio, "typing_start", sender, receiver)
+
+    def stop_typing(self, socketio, sid, sender, receiver):
+        if sid is not None and not self._allow(sid):
+            return
+        with self.lock:
+            typing = self.active.pop((sender, receiver), None)
+        # Nothing was announced, so there is nothing to stop
+        if typing:
+            self._emit(socketio, "typing_stop", sender, receiver)
+
+    def forget_sid(self, socketio, sid):
+        """Socket disconnected: stop whatever it was typing."""
+        self.limiter.forget(sid)
+        with self.lock:
+            keys = [key for key, typing in self.active.items() if typing.sid == sid]
+            for key in keys:
+                del self.active[key]
+        for sender, receiver in keys:
+            self._emit(socketio, "typing_stop", sender, receiver)
+
+    def sweep(self, socketio):
+        """Send the stop for everyone idle longer than idle_timeout."""
+        now = time.monotonic()
+        with self.lock:
+            idle = [key for key, typing in self.active.items() if now - typing.last_activity >= self.idle_timeout]
+            for key in idle:
+                del self.active[key]
+        for sender, receiver in idle:
+            self._emit(socketio, "typing_stop", sender, receiver)
+        return len(idle)
+
+    def run(self, socketio):
+        while True:
+            socketio.sleep(self.idle_timeout / 3)
+            try:
+                self.sweep(socketio)
+            except Exception as e:
+                log.error("typing_sweep_failed", error=str(e))
+
+    def start(self, socketio):
+        socketio.start_background_task(self.run, socketio)
+
+
+typing_relay = TypingRelay(
+    dedupe_window=Config.TYPING_DEDUPE_WINDOW,
+    idle_timeout=Config.TYPING_IDLE_TIMEOUT,
+    rate=Config.TYPING_RATE,
+    burst=Config.TYPING_BURST,
+)
@@ -0,0 +1,147 @@
+"""
+In-process cache of the user directory (uid, names, avatar) behind
+/users/<id>, /connext_users and /users/search.
+
+The directory version is a counter in the shared backend, so every worker
+notices a change made on any other. A short change log (version:uid) in the
+backend lets a worker refresh only the users that changed, and lets clients
+ask for "what changed since version N" instead of the whole list.
+"""
+import threading
+from database.db import fetch_all
+from services.shared_backend import shared_backend
+from services.user_search import UserSearchIndex
+
+_COLUMNS = "uid, username, first_name, last_name, gender, profile_picture_url"
+
+
+# KEYS = version counter, change log; ARGV = uid, log size. One step, so no
+# worker can read a version whose log entry isn't there yet.
+_RECORD_CHANGE = """
+local version = redis.call('INCR', KEYS[1])
+redis.call('RPUSH', KEYS[2], version .. ':' .. ARGV[1])
+redis.call('LTRIM', KEYS[2], -tonumber(ARGV[2]), -1)
+return version
+"""
+
+
+def _record_change(backend, keys, args):
+    version_key, log_key = keys
+    uid, size = args
+    version = backend.incr(version_key)
+    backend.rpush(log_key, f"{version}:{uid}")
+    backend.ltrim(log_key, -int(size), -1)
+    return version
+
+
+def _sort_key(user):
+    return ((user["first_name"] or "").lower(), user["uid"])
+
+
+class UserDirectory:
+    VERSION_KEY = "users:version"
+    LOG_KEY = "users:changes"
+    LOG_SIZE = 1000
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.version = None
+        self.users = []             # sorted by first name
+        self.by_uid = {}
+        self.position = {}          # uid -> index in self.users
+        self.index = UserSearchIndex()
+        self.lock = threading.Lock()
+        self._record = backend.script(_RECORD_CHANGE, _record_change)
+
+    # ---------------- writes ----------------
+    def invalidate(self, uid):
+        """Call after a user row is created or changed (and committed)."""
+        self._record([self.VERSION_KEY, self.LOG_KEY], [uid, self.LOG_SIZE])
+
+    def _log_since(self, version, current):
+        """
+        uids changed in (version, current], or None unless the log holds an
+        entry for every one of those versions (trimmed away, or lost).
+        """
+        entries = [e.split(":", 1) for e in self.backend.lrange(self.LOG_KEY, 0, -1)]
+        changed = {int(v): int(uid) for v, uid in entries if version < int(v) <= current}
+        if len(changed) != current - version:
+            return None
+        return set(changed.values())
+
+    # ---------------- cache ----------------
+    def _install(self, by_uid, version):
+        # Readers keep whatever list they already hold; swap in complete new ones
+        users = sorted(by_uid.values(), key=_sort_key)
+        self.position = {u["uid"]: i for i, u in enumerate(users)}
+        self.by_uid = by_uid
+        self.users = users
+        self.version = version
+
+    def _reload(self, version):
+        rows = fetch_all(f"SELECT {_COLUMNS} FROM user_table")
+        self.index.build(rows)
+        self._install({u["uid"]: u for u in rows}, version)
+
+    def _apply(self, uids, version):
+        rows = fetch_all(f"SELECT {_COLUMNS} FROM user_table WHERE uid = ANY(%s)", (list(uids),))
+        by_uid = dict(self.by_uid)
+        for user in rows:
+            by_uid[user["uid"]] = user
+            self.index.upsert(user)
+        self._install(by_uid, version)
+
+    def _fresh(self):
+        current = int(self.backend.get(self.VERSION_KEY) or 0)
+        with self.lock:
+            if self.version == current:
+                return current
+            changed = self._log_since(self.version, current) if self.version is not None else None
+            if changed is None:
+                self._reload(current)
+            elif changed:
+                self._apply(changed, current)
+            else:
+                self.version = current
+            return current
+
+    # ---------------- reads ----------------
+    def snapshot(self, exclude=None):
+        """(version, every user sorted by first name), optionally without `exclude`."""
+        version = self._fresh()
+        users = self.users
+        if exclude is not None:
+            users = [u for u in users if u["uid"] != int(exclude)]
+        return version, users
+
+    def changes_since(self, since):
+        """(version, changed users), or (version, None) when `since` is too old for a delta."""
+        version = self._fresh()
+        if since >= version:
+            return version, []
+        changed = self._log_since(since, version)
+        if changed is None:
+            return version, None
+        return version, [self.by_uid[uid] for uid in sorted(changed) if uid in self.by_uid]
+
+    def search(self, query="", cursor=None, limit=50):
+        """
+        With a query: the best `limit` matches from the search index, ranked
+        (no further pages). Without one: the directory a page at a time,
+        `cursor` being the uid the previous page ended on.
+        Returns (version, users, next_cursor).
+        """
+        version = self._fresh()
+        if query.strip():
+            by_uid = self.by_uid
+            uids = self.index.search(query, limit)
+            return version, [by_uid[uid] for uid in uids if uid in by_uid], None
+
+        users, position = self.users, self.position
+        start = position.get(cursor, -1) + 1 if cursor is not None else 0
+        page = users[start:start + limit]
+        next_cursor = page[-1]["uid"] if start + limit < len(users) else None
+        return version, page, next_cursor
+
+
+user_directory = UserDirectory(shared_backend)
@@ -0,0 +1,303 @@
+"""
+In-memory search index over username, first_name and last_name.
+
+Every name is split into lowercase tokens. A match is a token that starts
+with the query term; results are ranked by
+
+    (token length, field, token, uid)
+
+so exact matches come first, then the shortest completions, usernames
+before first names before last names. Four structures back it:
+
+    by_length   length -> sorted distinct tokens of that length. A prefix
+                is one bisect range per length, walked shortest first
+    ordered     token -> one sorted uid list per field. Within a length,
+                walking fields, then tokens, then uids visits users in rank
+                order, so a scan stops at its `limit`th user
+    prefix_uids every uid for each prefix up to SET_DEPTH chars. A query of
+                several terms checks a sample of the smallest set against
+                the others: if plenty match, it walks that term in rank
+                order; otherwise it intersects the sets (built from the
+                range for longer terms) and ranks the survivors
+    trigrams    (trigram, token length) -> tokens, for the typo fallback
+                when the prefix search finds nobody. Only the rarest
+                trigrams of the query are walked, and at most
+                FUZZY_MAX_CANDIDATES tokens are scored
+
+upsert() updates all of them for a single user, so a register costs a few
+list inserts instead of a rebuild.
+"""
+import heapq
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+from itertools import islice
+
+FIELDS = ("username", "first_name", "last_name")
+
+
+def tokenize(text):
+    return (text or "").lower().split()
+
+
+def trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _key(token, field, uid):
+    return (len(token), field, token, uid)
+
+
+def _prefixes(tokens, depth):
+    return {token[:d] for token in tokens for d in range(1, min(len(token), depth) + 1)}
+
+
+def _prefix_end(term):
+    """Smallest string greater than every string starting with `term`."""
+    return term[:-1] + chr(ord(term[-1]) + 1)
+
+
+class UserSearchIndex:
+    SET_DEPTH = 4
+    # Ranking a candidate directly costs about RANK_COST walked uids
+    RANK_COST = 4
+    # Driver uids checked against the other terms to guess how many match
+    SAMPLE = 64
+    MIN_SIMILARITY = 0.3
+    FUZZY_LENGTH_SLACK = 2
+    FUZZY_MAX_CANDIDATES = 150
+
+    def __init__(self):
+        self.by_length = {}         # length -> sorted distinct tokens
+        self.ordered = {}           # token -> ([uids], [uids], [uids]) by field, sorted
+        self.user_tokens = {}       # uid -> {token: best field}
+        self.prefix_uids = {}       # prefix -> {uid}, prefixes up to SET_DEPTH chars
+        self.trigrams = {}          # (trigram, length) -> {token}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.user_tokens)
+
+    def _add_token(self, token):
+        insort(self.by_length.setdefault(len(token), []), token)
+        self.ordered[token] = tuple([] for _ in FIELDS)
+        for gram in trigrams(token):
+            self.trigrams.setdefault((gram, len(token)), set()).add(token)
+
+    def _drop_token(self, token):
+        tokens = self.by_length[len(token)]
+        del tokens[bisect_left(tokens, token)]
+        self.ordered.pop(token, None)
+        for gram in trigrams(token):
+            self.trigrams.get((gram, len(token)), set()).discard(token)
+
+    # ---------------- building ----------------
+    @staticmethod
+    def _user_tokens(user):
+        found = {}
+        for field, name in enumerate(FIELDS):
+            for token in tokenize(user.get(name)):
+                found[token] = min(field, found.get(token, field))
+        return found
+
+    def build(self, users):
+        """Replace the index with `users` (an iterable of user dicts)."""
+        ordered, user_tokens, prefix_uids = {}, {}, {}
+        for user in users:
+            uid = user["uid"]
+            found = user_tokens[uid] = self._user_tokens(user)
+            for token, field in found.items():
+                lists = ordered.get(token)
+                if lists is None:
+                    lists = ordered[token] = tuple([] for _ in FIELDS)
+                lists[field].append(uid)
+            for prefix in _prefixes(found, self.SET_DEPTH):
+                prefix_uids.setdefault(prefix, set()).add(uid)
+
+        by_length, grams = {}, {}
+        for token, lists in ordered.items():
+            by_length.setdefault(len(token), []).append(token)
+            for uid_list in lists:
+                uid_list.sort()
+            for gram in trigrams(token):
+                grams.setdefault((gram, len(token)), set()).add(token)
+        for tokens in by_length.values():
+            tokens.sort()
+
+        with self.lock:
+            self.by_length = by_length
+            self.ordered = ordered
+            self.user_tokens = user_tokens
+            self.prefix_uids = prefix_uids
+            self.trigrams = grams
+
+    def upsert(self, user):
+        """Add a new user or re-index one whose names changed."""
+        uid = user["uid"]
+        found = self._user_tokens(user)
+        with self.lock:
+            old = self.user_tokens.get(uid, {})
+
+            for token, field in old.items():
+                if found.get(token) == field:
+                    continue
+                lists = self.ordered[token]
+                del lists[field][bisect_left(lists[field], uid)]
+                if not any(lists):
+                    self._drop_token(token)
+
+            for token, field in found.items():
+                if old.get(token) == field:
+                    continue
+                if token not in self.ordered:
+                    self._add_token(token)
+                insort(self.ordered[token][field], uid)
+
+            self.user_tokens[uid] = found
+            old_prefixes, new_prefixes = _prefixes(old, self.SET_DEPTH), _prefixes(found, self.SET_DEPTH)
+            for prefix in old_prefixes - new_prefixes:
+                self.prefix_uids[prefix].discard(uid)
+            for prefix in new_prefixes - old_prefixes:
+                self.prefix_uids.setdefault(prefix, set()).add(uid)
+
+    # ---------------- queries ----------------
+    def _uids(self, term):
+        """Every uid with a token starting with `term` (shared set: don't modify)."""
+        if len(term) <= self.SET_DEPTH:
+            return self.prefix_uids.get(term, set())
+        uids = set()
+        end = _prefix_end(term)
+        for length, tokens in self.by_length.items():
+            if length >= len(term):
+                for i in range(bisect_left(tokens, term), bisect_left(tokens, end)):
+                    uids.update(*self.ordered[tokens[i]])
+        return uids
+
+    def _best_key(self, uid, term):
+        return min(_key(token, field, uid) for token, field in self.user_tokens[uid].items() if token.startswith(term))
+
+    def _scan(self, term, limit=None, accept=None):
+        """
+        uid -> best key over the tokens starting with `term`, optionally only
+        uids passing `accept`, best first. Keys are visited in rank order
+        (length, then field, token and uid), so the first key seen for a uid
+        is its best one and a scan with a limit stops at the `limit`th uid.
+        """
+        ranked = {}
+        end = _prefix_end(term)
+        for length in sorted(l for l in self.by_length if l >= len(term)):
+            tokens = self.by_length[length]
+            lo, hi = bisect_left(tokens, term), bisect_left(tokens, end)
+            if lo == hi:
+                continue
+            for field in range(len(FIELDS)):
+                for i in range(lo, hi):
+                    token = tokens[i]
+                    for uid in self.ordered[token][field]:
+                        if uid in ranked or (accept is not None and not accept(uid)):
+                            continue
+                        ranked[uid] = _key(token, field, uid)
+                        if limit is not None and len(ranked) >= limit:
+                            return ranked
+        return ranked
+
+    def _fuzzy(self, term, exclude, limit):
+        wanted = trigrams(term)
+        lengths = range(len(term) - self.FUZZY_LENGTH_SLACK, len(term) + self.FUZZY_LENGTH_SLACK + 1)
+
+        # A token of n chars has n + 1 trigrams. To reach MIN_SIMILARITY even
+        # the shortest allowed one needs `need` of the query's trigrams, so it
+        # holds at least one of the len(wanted) - need + 1 rarest: only those
+        # lists are walked, and the very common ones ("  m") never are
+        shortest = max(1, len(term) - self.FUZZY_LENGTH_SLACK + 1)
+        need = -(-self.MIN_SIMILARITY * (len(wanted) + shortest) // (1 + self.MIN_SIMILARITY))
+        lists = sorted(
+            ([self.trigrams.get((gram, length), ()) for length in lengths] for gram in wanted),
+            key=lambda per_length: sum(len(tokens) for tokens in per_length),
+        )
+        candidates = set()
+        for per_length in lists[:max(1, len(wanted) - int(need) + 1)]:
+            for tokens in per_length:
+                for token in tokens:
+                    candidates.add(token)
+                    if len(candidates) >= self.FUZZY_MAX_CANDIDATES:
+                        break
+                else:
+                    continue
+                break
+
+        shared = Counter()
+        for gram in wanted:
+            for length in lengths:
+                tokens = self.trigrams.get((gram, length))
+                if tokens:
+                    shared.update(candidates.intersection(tokens))
+
+        scored = []
+        for token, common in shared.items():
+            similarity = common / (len(wanted) + len(token) + 1 - common)
+            if similarity >= self.MIN_SIMILARITY:
+                scored.append((-similarity, token))
+
+        found = []
+        for _, token in sorted(scored):
+            for uids in self.ordered[token]:
+                for uid in uids:
+                    if uid not in exclude:
+                        exclude.add(uid)
+                        found.append(uid)
+                        if len(found) == limit:
+                            return found
+        return found
+
+    def search(self, query, limit=20, fuzzy=True):
+        """uids of the best `limit` matches for `query`, best first."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        terms = list(dict.fromkeys(terms))
+        with self.lock:
+            if len(terms) > 1:
+                return self._search_all(terms, limit)
+
+            term = terms[0]
+            ranked = self._scan(term, limit)
+            uids = [key[3] for key in heapq.nsmallest(limit, ranked.values())]
+
+            # Only a query that matches no name at all is taken for a typo
+            if fuzzy and not uids and len(term) >= 3:
+                uids = self._fuzzy(term, set(), limit)
+            return uids
+
+    def _search_all(self, terms, limit):
+        """Users matching every term, ranked by the term that matches fewest users."""
+        sets = [(self._uids(term), term) for term in terms]
+        sets.sort(key=lambda pair: len(pair[0]))
+        driver_uids, driver = sets[0]
+        others = [uids for uids, _ in sets[1:]]
+        accept = others[0].__contains__ if len(others) == 1 else (lambda uid: all(uid in s for s in others))
+
+        # Intersecting two big sets (think "e l") costs more than the whole
+        # budget. When a sample of the driver says well over `limit` users
+        # match, walk the driver in rank order and stop at the `limit`th
+        sample = list(islice(driver_uids, self.SAMPLE))
+        hits = sum(1 for uid in sample if accept(uid))
+        if hits * len(driver_uids) > 2 * limit * len(sample):
+            ranked = self._scan(driver, limit, accept)
+            return [key[3] for key in heapq.nsmallest(limit, ranked.values())]
+
+        candidates = driver_uids
+        for uids in others:
+            candidates = candidates & uids        # walks the smaller side
+        if not candidates:
+            return []
+
+        # Few survivors: rank each one. Many: walk the driver in rank order,
+        # which finds `limit` of them after about limit * |driver| / |candidates| uids
+        if len(candidates) * self.RANK_COST <= limit * len(driver_uids) / len(candidates):
+            keys = (self._best_key(uid, driver) for uid in candidates)
+            return [key[3] for key in heapq.nsmallest(limit, keys)]
+        ranked = self._scan(driver, limit, candidates.__contains__)
+        return [key[3] for key in heapq.nsmallest(limit, ranked.values())]
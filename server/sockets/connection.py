@@ -1,13 +1,16 @@
 from flask import request
 from flask_socketio import disconnect, emit
-from flask_jwt_extended import decode_token, create_access_token, verify_jwt_in_request, get_jwt_identity
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity, get_jwt
 from extensions import socketio
 from services.online_users import online_manager
-from datetime import datetime, timedelta
-from Models.get_db_connection import get_db_connection
+from services.presence_broadcast import presence_broadcaster
+from services.token_refresh import refresh_scheduler
+from services.typing_relay import typing_relay
+from services.socket_sessions import socket_sessions, authenticated
 from flask_socketio import join_room
-import threading
-import time
+from Utils.log import get_logger
+
+log = get_logger("sockets.connection")
 
 # =========================
 # SOCKET CONNECT
@@ -20,123 +23,38 @@ def handle_connect():
 
         if user_id:
             join_room(f"user_{user_id}")
-            print(f"User {user_id} joined room user_{user_id}")
-
-        # Store user_id in this request
-        request.environ["user_id"] = user_id
+            log.debug("socket_connected", user=user_id, sid=request.sid)
 
-        # Handle online users
-        existing_sid = online_manager.get_user_sid(user_id)
-        if existing_sid and existing_sid != request.sid:
-            socketio.server.disconnect(existing_sid)
-            online_manager.remove_user(user_id)
-            stop_refresh_timer(user_id)
+        # Everything the handlers need about this socket, verified once
+        session = socket_sessions.open(request.sid, user_id, get_jwt())
+        session.rooms.add(f"user_{user_id}")
 
-        online_manager.add_user(user_id, request.sid)
-        schedule_token_refresh(user_id, request.sid)
+        # Handle online users (each device keeps its own sid)
+        came_online = online_manager.add_user(user_id, request.sid)
+        refresh_scheduler.schedule(user_id, request.sid)
 
-        emit(
-            "user_online",
-            {"user_id": user_id, "timestamp": datetime.utcnow().isoformat()},
-            broadcast=True,
-        )
+        if came_online:
+            presence_broadcaster.mark(user_id, True)
 
-        emit(
-            "online_users_list",
-            {"online_users": online_manager.get_all_users()},
-            room=request.sid,
-        )
+        # Contacts only; later changes arrive as presence_delta
+        emit("presence_snapshot", presence_broadcaster.snapshot(user_id), room=request.sid)
     except Exception as e:
-        print(f"SOCKET AUTH FAILED: {e}")
+        log.warning("socket_auth_failed", error=str(e))
         disconnect()
 
 @socketio.on("disconnect")
 def handle_disconnect():
-    uid = online_manager.remove_user_by_sid(request.sid)
-    if uid:
-        stop_refresh_timer(uid)
-        emit("user_offline", {"user_id": uid}, broadcast=True)
-        print(f"USER DISCONNECTED | user={uid}")
-
-
-
-
-# =========================
-# TOKEN REFRESH SYSTEM
-# =========================
-def refresh_worker(user_id, sid, stop_event):
-    print(f"TOKEN REFRESH STARTED | user={user_id}")
-
-    while not stop_event.is_set():
-        time.sleep(900)
-
-        if stop_event.is_set():
-            break
-
-        if online_manager.get_user_sid(user_id) != sid:
-            break
-
-        try:
-            conn = get_db_connection()
-            cur = conn.cursor()
-            cur.execute(
-                "SELECT uid, username FROM user_table WHERE uid = %s",
-                (int(user_id),),
-            )
-            user = cur.fetchone()
-            cur.close()
-            conn.close()
-
-            if not user:
-                break
-
-            new_token = create_access_token(
-                identity=str(user["uid"]),
-                additional_claims={
-                    "uid": user["uid"],
-                    "username": user["username"],
-                },
-                expires_delta=timedelta(minutes=30),
-            )
-
-            socketio.emit(
-                "token_refreshed",
-                {
-                    "access_token": new_token,
-                    "user_id": user["uid"],
-                    "timestamp": datetime.utcnow().isoformat(),
-                },
-                room=sid,
-            )
-
-            print(f"TOKEN REFRESHED | user={user_id}")
-
-        except Exception as e:
-            print(f"❌ REFRESH ERROR | user={user_id}: {e}")
-            time.sleep(5)
-
-    print(f"REFRESH STOPPED | user={user_id}")
-
-
-def schedule_token_refresh(user_id, sid):
-    stop_refresh_timer(user_id)
-
-    stop_event = threading.Event()
-    thread = threading.Thread(
-        target=refresh_worker,
-        args=(user_id, sid, stop_event),
-        daemon=True,
-    )
-    thread.start()
-
-    online_manager.refresh_timers[user_id] = {
-        "thread": thread,
-        "stop_event": stop_event,
-        "sid": sid,
-    }
-
-
-def stop_refresh_timer(user_id):
-    info = online_manager.refresh_timers.pop(user_id, None)
-    if info:
-        info["stop_event"].set()
+    refresh_scheduler.cancel(request.sid)
+    typing_relay.forget_sid(socketio, request.sid)
+    socket_sessions.close(request.sid)
+    uid, went_offline = online_manager.remove_sid(request.sid)
+    if went_offline:
+        presence_broadcaster.mark(uid, False)
+        log.debug("user_offline", user=uid)
+
+
+@socketio.on("presence_sync")
+@authenticated
+def handle_presence_sync(session):
+    """Client lost track of deltas (e.g. after a reconnect) and wants a fresh snapshot."""
+    emit("presence_snapshot", presence_broadcaster.snapshot(session.uid), room=request.sid)
@@ -1,98 +1,78 @@
 from flask import request, Blueprint
 from extensions import socketio
 from flask_socketio import emit
-from Models.get_db_connection import get_db_connection
-from datetime import datetime
-import pytz
+from database.db import get_connection
 from Utils.rooms import private_room
-from extensions import fernet
+from services.message_cache import message_cache
+from services.crypto import message_crypto
+from services import conversations, message_events
+from services.socket_sessions import authenticated
+from services.rate_limit import limit_event, edit_limiter
+from Utils.log import get_logger
 
-edit_bp = Blueprint("edit", __name__)
-
-def encrypt_msg(message: str) -> str:
-    return fernet.encrypt(message.encode()).decode()
+log = get_logger("sockets.edit")
 
-def decrypt_message(message: str) -> str:
-    return fernet.decrypt(message.encode()).decode()
+edit_bp = Blueprint("edit", __name__)
 
 
 @socketio.on("edit_message")
-def handle_edit_message(data):
+@authenticated
+@limit_event(edit_limiter)
+def handle_edit_message(session, data):
     """Handle message editing"""
     try:
         message_id = data.get("message_id")
-        sender_id = str(data.get("sender_id", ""))
-        receiver_id = str(data.get("receiver_id", ""))
+        sender_id = session.uid
         new_content = data.get("new_content", "").strip()
         
-        if not all([message_id, sender_id, receiver_id, new_content]):
+        if not all([message_id, new_content]):
             emit("error", {"message": "Missing required fields"}, room=request.sid)
             return
         
         # Get time in Philippine timezone
-        edited_at = datetime.now().astimezone(pytz.timezone('Asia/Manila')).strftime("%H:%M %p %S")
+        edited_at = message_events.edited_at()
         
-        # Get fresh database connection
-        conn = get_db_connection()
-        temp_cursor = conn.cursor()
+        encrypt = message_crypto.encrypt(new_content)
 
-        encrypt = encrypt_msg(new_content)
-        
-        # Check if the message exists and user is the sender
-        temp_cursor.execute(
-            """
-            SELECT message_id, sender_id, content 
-            FROM messages 
-            WHERE message_id = %s AND sender_id = %s
-            """,
-            (int(message_id), int(sender_id))
-        )
-        message = temp_cursor.fetchone()
-        
-        if not message:
-            emit("error", {"message": "Message not found or unauthorized"}, room=request.sid)
+        with get_connection() as conn:
+            temp_cursor = conn.cursor()
+
+            # Ownership is part of the UPDATE: no row comes back unless the caller sent it
+            temp_cursor.execute(
+                """
+                UPDATE messages 
+                SET content = %s, is_edited = TRUE, edited_at = %s
+                WHERE message_id = %s AND sender_id = %s
+                RETURNING message_id, sender_id, receiver_id, is_edited, edited_at
+                """,
+                (encrypt, edited_at, int(message_id), int(sender_id))
+            )
+
+            updated_message = temp_cursor.fetchone()
+            if not updated_message:
+                emit("error", {"message": "Message not found or unauthorized"}, room=request.sid)
+                temp_cursor.close()
+                return
+
+            conversations.record_edit(
+                temp_cursor, updated_message["message_id"],
+                updated_message["sender_id"], updated_message["receiver_id"], encrypt
+            )
+            conn.commit()
             temp_cursor.close()
-            conn.close()
-            return
-        
-        # Update the message
-        temp_cursor.execute(
-            """
-            UPDATE messages 
-            SET content = %s, is_edited = TRUE, edited_at = %s
-            WHERE message_id = %s
-            RETURNING message_id, sender_id, receiver_id, content, is_edited, edited_at
-            """,
-            (encrypt, edited_at, int(message_id))
-        )
-        
-        updated_message = temp_cursor.fetchone()
-        conn.commit()
+
+        message_cache.invalidate(int(message_id))
+        message_cache.put(updated_message["message_id"], encrypt, new_content)
         
         if updated_message:
-            # Convert to proper JSON-serializable format
-            message_dict = dict(updated_message)
-            message_dict["edited_at"] = edited_at
-            
-            room = private_room(sender_id, receiver_id)
+            room = private_room(updated_message["sender_id"], updated_message["receiver_id"])
             
             # Emit the edited message to the room
-            emit("message_edited", {
-                "message_id": message_dict["message_id"],
-                "sender_id": message_dict["sender_id"],
-                "receiver_id": message_dict["receiver_id"],
-                "content": decrypt_message(message_dict["content"]),
-                "is_edited": message_dict["is_edited"],
-                "edited_at": message_dict["edited_at"]
-            }, room=room, namespace='/')
+            emit("message_edited", message_events.message_edited(updated_message, new_content, edited_at),
+                 room=room, namespace='/')
             
-            print(f"✅ Message {message_id} edited by {sender_id}")
-        
-        temp_cursor.close()
-        conn.close()
+            log.debug("message_edited", user=sender_id, message_id=message_id)
         
     except Exception as e:
-        print(f"❌ Error editing message: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("edit_message_failed", user=session.uid)
         emit("message_error", {"error": str(e)}, room=request.sid)
\ No newline at end of file
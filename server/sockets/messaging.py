@@ -1,25 +1,32 @@
-from flask import request, jsonify, Blueprint
+from flask import request, Blueprint
 from flask_socketio import emit, join_room, leave_room
-from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity, jwt_required
 from extensions import socketio
-from Utils.rooms import private_room
-from database.db import get_db_connection
-import pytz
-from datetime import datetime
-from extensions import fernet
+from Utils.rooms import private_room, message_rooms
+from database.db import get_connection, fetch_one
+from Config.Config import Config
+from services.message_cache import message_cache
+from services.crypto import message_crypto
+from services import conversations, message_events
+from services.online_users import online_manager
+from services.presence_broadcast import presence_broadcaster
+from services.message_pipeline import message_pipeline
+from services.typing_relay import typing_relay
+from services.socket_sessions import authenticated
+from services.rate_limit import limit_event, send_limiter
+from services.metrics import registry
+from Utils.log import get_logger
+
+log = get_logger("sockets.messaging")
+messages_sent = registry.counter("connext_messages_sent_total", "Messages accepted by send_message", ["mode"])
 
 messaging_bp = Blueprint("messaging", __name__)
 
-def encrypt_msg(message: str) -> str:
-    return fernet.encrypt(message.encode()).decode()
-
-def decrypt_message(message: str) -> str:
-    return fernet.decrypt(message.encode()).decode()
-
 @socketio.on("send_message")
-def handle_send_message(data):
+@authenticated
+@limit_event(send_limiter)
+def handle_send_message(session, data):
     try:
-        sender_id = request.environ.get("user_id")
+        sender_id = session.uid
 
         receiver_id = str(data.get("receiver_id", ""))
         content = data.get("content", "")
@@ -34,120 +41,124 @@ def handle_send_message(data):
             emit("error", {"message": "Too many characters"}, room=request.sid)
             return
 
-        encrypted_msg = encrypt_msg(content)
-
-        room = private_room(sender_id, receiver_id)
-        tz = pytz.timezone("Asia/Manila")
-        date_sent = datetime.now(tz).isoformat()
-
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        # 🔥 Insert message with reply
-        cur.execute(
-            """
-            INSERT INTO messages (
-                sender_id,
-                receiver_id,
-                content,
-                reply_to_message_id,
-                is_seen,
-                date_sent
+        encrypted_msg = message_crypto.encrypt(content)
+
+        date_sent = message_events.sent_at()
+
+        if Config.MESSAGE_PIPELINE:
+            # Write-behind: emit now, the pipeline commits and acks shortly after
+            saved_message = message_pipeline.submit(
+                request.sid, sender_id, receiver_id, encrypted_msg, reply_to, date_sent
             )
-            VALUES (%s, %s, %s, %s, %s, %s)
-            RETURNING *
-            """,
-            (int(sender_id), int(receiver_id), encrypted_msg, reply_to, False, date_sent)
+            reply_row = None
+            if reply_to:
+                reply_row = message_pipeline.get_pending(reply_to) or fetch_one(
+                    "SELECT message_id, sender_id, content FROM messages WHERE message_id = %s",
+                    (reply_to,)
+                )
+        else:
+            with get_connection() as conn:
+                cur = conn.cursor()
+
+                # 🔥 Insert message with reply
+                cur.execute(
+                    """
+                    INSERT INTO messages (
+                        sender_id,
+                        receiver_id,
+                        content,
+                        reply_to_message_id,
+                        is_seen,
+                        date_sent
+                    )
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    RETURNING *
+                    """,
+                    (int(sender_id), int(receiver_id), encrypted_msg, reply_to, False, date_sent)
+                )
+
+                saved_message = cur.fetchone()
+                conversations.record_message(cur, saved_message)
+                conn.commit()
+
+                # 🔁 Fetch replied message (if any)
+                reply_row = None
+                if reply_to:
+                    cur.execute(
+                        """
+                        SELECT message_id, sender_id, content
+                        FROM messages
+                        WHERE message_id = %s
+                        """,
+                        (reply_to,)
+                    )
+                    reply_row = cur.fetchone()
+
+                cur.close()
+
+        # We already know the plaintext of what we just wrote
+        message_cache.put(saved_message["message_id"], encrypted_msg, content)
+
+        message_dict = message_events.new_message(
+            saved_message, content, date_sent, reply_row, pending=Config.MESSAGE_PIPELINE
         )
 
-        saved_message = cur.fetchone()
-        conn.commit()
-
-        # 🔁 Fetch replied message (if any)
-        reply_data = None
-        if reply_to:
-            cur.execute(
-                """
-                SELECT message_id, sender_id, content
-                FROM messages
-                WHERE message_id = %s
-                """,
-                (reply_to,)
+        messages_sent.labels("pipeline" if Config.MESSAGE_PIPELINE else "direct").inc()
+        log.debug("message_saved", sender=sender_id, receiver=receiver_id, message_id=message_dict["message_id"])
+
+        # Sending ends the typing indicator
+        typing_relay.stop_typing(socketio, None, str(sender_id), receiver_id)
+
+        # One packet, encoded once, to everyone in the chat room or either
+        # user's own room; a socket in several of them still gets it once
+        emit("new_message", message_dict, to=message_rooms(sender_id, receiver_id))
+
+        # First message between the two: the sender starts following the receiver's presence
+        if presence_broadcaster.add_contact(sender_id, receiver_id) and online_manager.is_online(receiver_id):
+            emit(
+                "presence_delta",
+                {"version": presence_broadcaster.version(), "online": [str(receiver_id)], "offline": []},
+                room=f"user_{sender_id}",
             )
-            reply_row = cur.fetchone()
-            if reply_row:
-                reply_data = {
-                    "message_id": reply_row["message_id"],
-                    "sender_id": reply_row["sender_id"],
-                    "content": decrypt_message(reply_row["content"])
-                }
-
-        cur.close()
-        conn.close()
-
-        # ✅ Prepare socket payload
-        message_dict = {
-            "message_id": saved_message["message_id"],
-            "sender_id": saved_message["sender_id"],
-            "receiver_id": saved_message["receiver_id"],
-            "content": decrypt_message(saved_message["content"]),
-            "is_seen": saved_message["is_seen"],
-            "date_sent": date_sent,
-            "reply_to_message_id": reply_to,
-            "reply": reply_data  # 👈 NEW
-        }
-
-        print(f"✅ Message saved from {sender_id} to {receiver_id}")
-
-        emit("new_message", message_dict, room=room)
-
-        emit(
-        "user_list_update",
-        {
-            "type": "new_message",
-            "sender_id": sender_id,
-            "receiver_id": receiver_id,
-            "message": message_dict,
-        },
-        room=f"user_{receiver_id}"
-        )
-        emit(
-            "user_list_update",
-            {
-                "type": "new_message",
-                "sender_id": sender_id,
-                "receiver_id": receiver_id,
-                "message": message_dict,
-            },
-            room=f"user_{sender_id}"
-        )
 
 
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        log.exception("send_message_failed", sender=session.uid)
         emit("message_error", {"error": str(e)}, room=request.sid)
 
     
 
+def _other_party(session, data):
+    """The payload names both users; only rooms the caller is part of may be joined."""
+    users = {str(data.get("user1", "")), str(data.get("user2", ""))}
+    if session.uid not in users:
+        return None
+    users.discard(session.uid)
+    other = users.pop() if users else session.uid
+    return other or None
+
 @socketio.on("join_private")
-def handle_join(data):
-    user1 = str(data["user1"])
-    user2 = str(data["user2"])
-    room = private_room(user1, user2)
+@authenticated
+def handle_join(session, data):
+    other = _other_party(session, data)
+    if not other:
+        emit("error", {"message": "Cannot join this room"}, room=request.sid)
+        return
+    room = private_room(session.uid, other)
     
     join_room(room)
-    print(f"👥 User {user1} joined room {room} with {user2}")
+    session.rooms.add(room)
+    log.debug("room_joined", user=session.uid, room=room)
     emit("joined_room", {"room": room})
 
 @socketio.on("leave_private")
-def handle_leave(data):
-    user1 = str(data.get("user1", ""))
-    user2 = str(data.get("user2", ""))
-    
-    if not all([user1, user2]):
+@authenticated
+def handle_leave(session, data):
+    other = _other_party(session, data)
+    if not other:
         return
     
-    room = private_room(user1, user2)
+    room = private_room(session.uid, other)
     leave_room(room)
-    print(f"👋 User {user1} left room {room} with {user2}")
\ No newline at end of file
+    session.rooms.discard(room)
+    log.debug("room_left", user=session.uid, room=room)
\ No newline at end of file
@@ -1,34 +1,29 @@
 from extensions import socketio
-from Utils.rooms import private_room
-from flask_socketio import emit
-from flask import Blueprint
+from flask import Blueprint, request
+from services.typing_relay import typing_relay
+from services.socket_sessions import authenticated
 
 typing_bp = Blueprint("typing", __name__)
 
 @socketio.on("typing_start")
-def handle_typing_start(data):
-    sender = str(data.get("sender_id", ""))
+@authenticated
+def handle_typing_start(session, data):
+    sender = session.uid
     receiver = str(data.get("receiver_id", ""))
     
     if not all([sender, receiver]):
         return
     
-    room = private_room(sender, receiver)
-    emit("typing_start", {
-        "sender_id": sender,
-        "receiver_id": receiver
-    }, room=room, namespace='/')
+    # Deduplicated, rate limited and auto-stopped by the relay
+    typing_relay.start_typing(socketio, request.sid, sender, receiver)
 
 @socketio.on("typing_stop")
-def handle_typing_stop(data):
-    sender = str(data.get("sender_id", ""))
+@authenticated
+def handle_typing_stop(session, data):
+    sender = session.uid
     receiver = str(data.get("receiver_id", ""))
     
     if not all([sender, receiver]):
         return
     
-    room = private_room(sender, receiver)
-    emit("typing_stop", {
-        "sender_id": sender,
-        "receiver_id": receiver
-    }, room=room, namespace='/')
\ No newline at end of file
+    typing_relay.stop_typing(socketio, request.sid, sender, receiver)
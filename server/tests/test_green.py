@@ -0,0 +1,70 @@
+"""
+database/green.py: a query waiting on Postgres must not hold up the hub.
+
+A fake connection stands in for psycopg2: its poll() reports POLL_READ
+until the "server" answers by writing to a socket pair, which is the fd
+the wait callback trampolines on.
+"""
+import socket
+import eventlet
+from psycopg2 import extensions
+from database.green import eventlet_wait_callback
+
+
+class SlowConnection:
+    """A query that is answered once `answer()` is called."""
+
+    def __init__(self):
+        self.client, self.server = socket.socketpair()
+        self.answered = False
+        self.cancelled = False
+
+    def fileno(self):
+        return self.client.fileno()
+
+    def poll(self):
+        return extensions.POLL_OK if self.answered else extensions.POLL_READ
+
+    def answer(self):
+        self.answered = True
+        self.server.send(b"x")
+
+    def cancel(self):
+        self.cancelled = True
+
+    def close(self):
+        self.client.close()
+        self.server.close()
+
+
+def test_unrelated_handler_runs_while_query_pending():
+    conn = SlowConnection()
+    query = eventlet.spawn(eventlet_wait_callback, conn)
+
+    def handler():
+        # Stands in for a Socket.IO event on another client's greenlet
+        eventlet.sleep(0.01)
+        return "pong"
+
+    try:
+        assert eventlet.spawn(handler).wait() == "pong"
+        assert not query.dead, "the query finished before the server answered"
+
+        conn.answer()
+        with eventlet.Timeout(1):
+            query.wait()
+        assert query.dead
+    finally:
+        conn.close()
+
+
+def test_killed_query_is_cancelled_on_the_server():
+    conn = SlowConnection()
+    query = eventlet.spawn(eventlet_wait_callback, conn)
+    eventlet.sleep(0)           # let it reach the trampoline
+
+    try:
+        query.kill()
+        assert conn.cancelled
+    finally:
+        conn.close()
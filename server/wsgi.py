@@ -6,6 +6,7 @@ from main import app, socketio
 application = app
 
 if __name__ == '__main__':
-    print("🚀 Starting SocketIO server...")
+    from Utils.log import get_logger
+    get_logger("server").info("server_starting", port=5000)
     socketio.run(app, host='0.0.0.0', port=5000, debug=True)
 